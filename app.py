@@ -1,23 +1,62 @@
 # app.py (Final version with voice manager)
+import os
+import uuid
+import threading
 import gradio as gr
+import numpy as np
 import pandas as pd
 from utils import (
     get_supported_languages,
     get_piper_voices, # Gets locally installed voices
-    process_diarization_and_translation,
-    synthesize_and_combine
+    iter_diarization_and_translation,
+    synthesize_and_combine,
+    preload_voices_for_langs,
+    get_model_status,
+    start_background_warmup
 )
-from downloader import get_all_piper_voice_names, download_voice_if_needed
+from downloader import get_all_piper_voice_names, download_voice_if_needed, prefetch_language
+from jobs import scheduler
+from voice_registry import get_registry, index_voice_names
+from metrics import Trace, job_trace, start_metrics_server, traced_iter
+from streaming import MAX_UTTERANCE_SECONDS, STREAM_CHUNK_SECONDS, StreamingTranslator
+from segment_planner import MAX_MERGE_GAP_SECONDS, MAX_SEGMENT_SECONDS, MIN_SEGMENT_SECONDS, SHORT_ABSORB
 
 # --- Load data once on startup ---
 supported_langs = get_supported_languages()
 ALL_PIPER_VOICES = get_all_piper_voice_names()
+PIPER_VOICES_BY_LANG = index_voice_names(ALL_PIPER_VOICES)
+
+# Target languages whose installed voices are loaded into memory at startup,
+# e.g. PRELOAD_VOICE_LANGS=fr,de. Empty by default.
+PRELOAD_VOICE_LANGS = [code.strip() for code in os.environ.get("PRELOAD_VOICE_LANGS", "").split(",") if code.strip()]
+
+# Canary and the diarization pipeline are loaded in the background once the UI is up.
+# With WARMUP_MODELS=0 they are loaded on the first request instead.
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "1") != "0"
+
+# Prometheus metrics are served on http://METRICS_HOST:METRICS_PORT/metrics next to the UI.
+# Like the UI, the endpoint only accepts local connections by default; set METRICS_HOST=0.0.0.0
+# to let a Prometheus server on another machine scrape it. METRICS_PORT=0 disables the endpoint.
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+
+# When set, the timing spans of every request are written to TRACE_DIR/trace-<job id>.json.
+TRACE_DIR = os.environ.get("TRACE_DIR", "")
+
+# Segment planner thresholds, in seconds (see segment_planner.plan_segments).
+# SHORT_SEGMENTS=drop discards short fragments instead of keeping them.
+PLAN_OPTIONS = {
+    "max_gap": float(os.environ.get("SEGMENT_MERGE_GAP_SECONDS", MAX_MERGE_GAP_SECONDS)),
+    "min_duration": float(os.environ.get("SEGMENT_MIN_SECONDS", MIN_SEGMENT_SECONDS)),
+    "max_duration": float(os.environ.get("SEGMENT_MAX_SECONDS", MAX_SEGMENT_SECONDS)),
+    "short_policy": os.environ.get("SHORT_SEGMENTS", SHORT_ABSORB),
+}
 
 def get_all_voices_for_lang(lang_code):
-    """Filters the complete list of voices for a given language code."""
+    """Returns the downloadable voices of a language code."""
     if not lang_code:
         return []
-    return [voice for voice in ALL_PIPER_VOICES if voice.startswith(f"{lang_code}_")]
+    return list(PIPER_VOICES_BY_LANG.get(lang_code, []))
 
 # NEW: Function to display installed voices in a readable format
 def get_installed_voices_df():
@@ -31,6 +70,11 @@ def get_installed_voices_df():
         data.append({"Language": lang, "Installed Voices": ", ".join(voices)})
     return pd.DataFrame(data)
 
+def get_model_status_text():
+    """Returns a one-line summary of which models are ready."""
+    status = get_model_status()
+    return f"Canary: {status['canary']} | Diarization: {status['diarization']}"
+
 
 # --- Voice Manager Functions (NEW) ---
 
@@ -56,12 +100,33 @@ def handle_voice_download(voice_name):
         
     return status_message, get_installed_voices_df()
 
+def handle_language_prefetch(lang_name):
+    """Downloads every voice of the selected language at once."""
+    if not lang_name:
+        return "Please select a language.", get_installed_voices_df()
+
+    results = prefetch_language(supported_langs.get(lang_name))
+    failed = [voice_name for voice_name, success in results.items() if not success]
+    status_message = f"{len(results) - len(failed)}/{len(results)} voice(s) for {lang_name} are ready."
+    if failed:
+        status_message += f" Failed: {', '.join(failed)}. Check the console."
+    return status_message, get_installed_voices_df()
+
 
 # --- Gradio Interface Functions (MODIFIED) ---
 
-def step1_process_audio(audio_file, num_speakers, source_lang_name, target_lang_name):
+def format_results_df(segments_data):
+    """Returns the columns of the segments shown in the results table."""
+    df = pd.DataFrame(segments_data)
+    df_display = df[['start', 'end', 'speaker', 'translated_text']].copy()
+    df_display['start'] = df_display['start'].round(2)
+    df_display['end'] = df_display['end'].round(2)
+    return df_display
+
+def step1_process_audio(audio_file, num_speakers, source_lang_name, target_lang_name, progress=gr.Progress()):
     """
     First step: Diarization and Translation.
+    Rows are streamed into the results table as each batch of segments is translated.
     """
     if audio_file is None:
         raise gr.Error("Please provide an audio file.")
@@ -72,18 +137,26 @@ def step1_process_audio(audio_file, num_speakers, source_lang_name, target_lang_
     if source_lang_code != 'en' and target_lang_code != 'en':
         raise gr.Error("Translation is only supported to/from English with Canary-1b-v2.")
 
-    segments_data = process_diarization_and_translation(
-        audio_file, int(num_speakers), source_lang_code, target_lang_code
-    )
+    segments_data = []
+    unchanged_dropdowns = [gr.update() for _ in range(10)]
+    # Gradio may resume this generator from different threads, so the trace is attached per step.
+    trace = Trace(uuid.uuid4().hex)
+    for batch in traced_iter(iter_diarization_and_translation(
+        audio_file, int(num_speakers), source_lang_code, target_lang_code, progress=progress,
+        plan_options=PLAN_OPTIONS
+    ), trace):
+        segments_data.extend(batch)
+        yield format_results_df(segments_data), segments_data, gr.update(visible=False), *unchanged_dropdowns
+    if TRACE_DIR:
+        trace.dump(TRACE_DIR)
 
     if not segments_data:
         gr.Warning("No speech segments were detected.")
-        return None, [], gr.update(visible=False), *(gr.Dropdown(visible=False) for _ in range(10))
+        yield None, [], gr.update(visible=False), *(gr.Dropdown(visible=False) for _ in range(10))
+        return
 
     df = pd.DataFrame(segments_data)
-    df_display = df[['start', 'end', 'speaker', 'translated_text']].copy()
-    df_display['start'] = df_display['start'].round(2)
-    df_display['end'] = df_display['end'].round(2)
+    df_display = format_results_df(segments_data)
 
     unique_speakers = sorted(df['speaker'].unique())
     voice_assignment_components = []
@@ -113,7 +186,7 @@ def step1_process_audio(audio_file, num_speakers, source_lang_name, target_lang_
     for _ in range(len(unique_speakers), 10):
         voice_assignment_components.append(gr.Dropdown(visible=False))
 
-    return df_display, segments_data, gr.update(visible=True), *voice_assignment_components
+    yield df_display, segments_data, gr.update(visible=True), *voice_assignment_components
 
 def step2_generate_audio(segments_data_json, *voice_choices):
     """
@@ -122,24 +195,73 @@ def step2_generate_audio(segments_data_json, *voice_choices):
     if not segments_data_json:
         raise gr.Error("Segment data is missing.")
 
-    # The download check is no longer critical here as voices are already local,
-    # but we keep it for safety.
     unique_speakers = sorted(list(set(seg['speaker'] for seg in segments_data_json)))
+    registry = get_registry()
     for voice in voice_choices[:len(unique_speakers)]:
-        if not download_voice_if_needed(voice): # This will just check for existence
+        if not voice or not registry.is_installed(voice):
              raise gr.Error(f"The required voice '{voice}' could not be found. Synthesis canceled.")
 
     voice_mapping = {speaker: voice for speaker, voice in zip(unique_speakers, voice_choices)}
     
-    final_audio_path = synthesize_and_combine(segments_data_json, voice_mapping)
+    # Each request writes into its own workspace, so concurrent users never share files.
+    job = scheduler.create_job()
+    try:
+        with job_trace(job.id, TRACE_DIR or None):
+            final_audio_path = synthesize_and_combine(segments_data_json, voice_mapping, output_dir=job.workspace)
+    finally:
+        scheduler.finish(job)
     
     return final_audio_path
 
+# --- Live Translation ---
+
+def update_live_voice_options(target_lang_name):
+    """Lists the installed voices of the live target language."""
+    voices = get_piper_voices().get(supported_langs.get(target_lang_name), [])
+    return gr.update(choices=voices, value=voices[0] if voices else None)
+
+def _live_output(results, translator):
+    """Joins the audio of new results into one chunk for the streaming output."""
+    spoken = [result for result in results if result["audio"] is not None]
+    transcript = "\n".join(result["translated_text"] for result in translator.transcript)
+    if not spoken:
+        return gr.skip(), transcript
+    return (spoken[0]["sample_rate"], np.concatenate([result["audio"] for result in spoken])), transcript
+
+def live_translate_chunk(chunk, translator, source_lang_name, target_lang_name, voice_name, max_utterance_seconds):
+    """Feeds one microphone chunk to the session and returns the translations that are ready."""
+    if chunk is None:
+        return gr.skip(), gr.skip(), translator
+    if translator is None or translator.closed:
+        source_lang_code = supported_langs[source_lang_name]
+        target_lang_code = supported_langs[target_lang_name]
+        if source_lang_code != 'en' and target_lang_code != 'en':
+            raise gr.Error("Translation is only supported to/from English with Canary-1b-v2.")
+        if not voice_name:
+            raise gr.Error("Please choose an installed voice for the live translation.")
+        translator = StreamingTranslator(source_lang_code, target_lang_code, voice_name,
+                                         max_utterance_seconds=max_utterance_seconds)
+    sample_rate, samples = chunk
+    translator.feed(samples, sample_rate)
+    return *_live_output(translator.results(), translator), translator
+
+def close_live_session(translator):
+    if translator is not None:
+        translator.close()
+
+def live_translate_stop(translator):
+    """Translates the last utterance when the recording stops and ends the session."""
+    if translator is None:
+        return gr.skip(), gr.skip(), None
+    translator.finish()
+    return *_live_output(translator.results(wait=True, timeout=60), translator), None
+
 # --- Build Gradio Interface ---
 
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# Voice-to-Voice Translation System")
     gr.Markdown("Uses `pyannote`, `Canary-1b-v2`, and `Piper-TTS`.")
+    model_status = gr.Textbox(value=get_model_status_text, label="Model status", interactive=False, every=2)
 
     # NEW: The voice manager
     with gr.Accordion("Piper Voice Manager (Open to download/view voices)", open=False):
@@ -152,6 +274,7 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
                 )
                 voice_select_for_dl = gr.Dropdown(label="2. Choose voice")
                 download_button = gr.Button("Download selected voice", variant="secondary")
+                prefetch_button = gr.Button("Download all voices for this language", variant="secondary")
                 download_status = gr.Textbox(label="Status", interactive=False)
             with gr.Column(scale=3):
                 gr.Markdown("### Currently Installed Voices")
@@ -195,6 +318,26 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
     with gr.Row():
         output_audio = gr.Audio(label="Final translated audio", type="filepath")
 
+    gr.Markdown("---")
+
+    with gr.Accordion("Live translation (microphone)", open=False):
+        gr.Markdown("Speak into the microphone; each sentence is translated and spoken as soon as you pause.")
+        with gr.Row():
+            live_source_dropdown = gr.Dropdown(choices=list(supported_langs.keys()), label="Source language", value="English")
+            live_target_dropdown = gr.Dropdown(choices=list(supported_langs.keys()), label="Target language", value="French")
+            live_voice_dropdown = gr.Dropdown(label="Voice", choices=get_piper_voices().get("fr", []))
+            live_max_utterance = gr.Slider(
+                minimum=2, maximum=20, value=MAX_UTTERANCE_SECONDS, step=1,
+                label="Maximum utterance length (s): lower is faster, higher is more accurate"
+            )
+        with gr.Row():
+            live_input = gr.Audio(sources=["microphone"], streaming=True, type="numpy", label="Microphone")
+            live_output = gr.Audio(streaming=True, autoplay=True, label="Translated speech")
+        live_transcript = gr.Textbox(label="Translation", lines=6, interactive=False)
+        # Sessions left without stop_recording (closed tab, lost connection) are closed with
+        # the Gradio session; the translator also closes itself after a while without audio.
+        live_state = gr.State(None, delete_callback=close_live_session)
+
     # --- Connect Events ---
 
     # NEW: Events for the voice manager
@@ -208,12 +351,37 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
         inputs=voice_select_for_dl,
         outputs=[download_status, installed_voices_df]
     )
+    prefetch_button.click(
+        fn=handle_language_prefetch,
+        inputs=lang_select_for_dl,
+        outputs=[download_status, installed_voices_df]
+    )
+
+    # Live translation events
+    live_target_dropdown.change(
+        fn=update_live_voice_options,
+        inputs=live_target_dropdown,
+        outputs=live_voice_dropdown
+    )
+    live_input.stream(
+        fn=live_translate_chunk,
+        inputs=[live_input, live_state, live_source_dropdown, live_target_dropdown, live_voice_dropdown, live_max_utterance],
+        outputs=[live_output, live_transcript, live_state],
+        stream_every=STREAM_CHUNK_SECONDS,
+        concurrency_limit=None # Concurrency is limited per stage by the job scheduler
+    )
+    live_input.stop_recording(
+        fn=live_translate_stop,
+        inputs=live_state,
+        outputs=[live_output, live_transcript, live_state]
+    )
 
     # Main workflow events
     process_button.click(
         fn=step1_process_audio,
         inputs=[audio_input, num_speakers_input, source_lang_dropdown, target_lang_dropdown],
-        outputs=[results_df, segments_state, assignment_group] + voice_assignment_inputs
+        outputs=[results_df, segments_state, assignment_group] + voice_assignment_inputs,
+        concurrency_limit=None # Concurrency is limited per stage by the job scheduler
     )
     
     def update_voice_dropdowns_visibility(num_speakers):
@@ -232,8 +400,19 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
     generate_button.click(
         fn=step2_generate_audio,
         inputs=[segments_state] + voice_assignment_inputs,
-        outputs=output_audio
+        outputs=output_audio,
+        concurrency_limit=None # Concurrency is limited per stage by the job scheduler
     )
 
 if __name__ == "__main__":
-    demo.launch(share=False)
\ No newline at end of file
+    demo.launch(share=False, prevent_thread_lock=True)
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            print(f"Metrics endpoint disabled, cannot listen on port {METRICS_PORT}: {e}")
+    if WARMUP_MODELS:
+        start_background_warmup()
+    if PRELOAD_VOICE_LANGS:
+        threading.Thread(target=preload_voices_for_langs, args=(PRELOAD_VOICE_LANGS,), daemon=True).start()
+    demo.block_thread()
\ No newline at end of file
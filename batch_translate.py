@@ -0,0 +1,230 @@
+# batch_translate.py
+"""
+Headless batch translation of many recordings.
+
+Example:
+    python batch_translate.py "recordings/**/*.wav" --source en --target fr --num-speakers 2 \
+        --default-voice fr_FR-siwis-medium --voice SPEAKER_01=fr_FR-tom-medium --workers 4
+
+Each input gets its own directory in --output-dir with the translated audio and a JSON
+and SRT transcript. Progress is recorded in a manifest, so running the same command
+again after a crash skips the files that are already done.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import job_trace, start_metrics_server
+from segment_planner import (
+    MAX_MERGE_GAP_SECONDS,
+    MAX_SEGMENT_SECONDS,
+    MIN_SEGMENT_SECONDS,
+    SHORT_ABSORB,
+    SHORT_DROP,
+)
+from utils import (
+    get_supported_languages,
+    get_audio_duration,
+    process_diarization_and_translation,
+    synthesize_and_combine,
+    start_background_warmup
+)
+
+def format_srt_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def write_srt(segments_data, path):
+    with open(path, "w", encoding="utf-8") as srt_file:
+        for i, segment in enumerate(segments_data, start=1):
+            srt_file.write(f"{i}\n")
+            srt_file.write(f"{format_srt_timestamp(segment['start'])} --> {format_srt_timestamp(segment['end'])}\n")
+            srt_file.write(f"[{segment['speaker']}] {segment['translated_text']}\n\n")
+
+def write_json_atomic(data, path):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+class Manifest:
+    """Per-file status of a batch run, saved after every change so a run can be resumed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as manifest_file:
+                self.files = json.load(manifest_file).get("files", {})
+
+    def is_done(self, audio_path):
+        return self.files.get(audio_path, {}).get("status") == "done"
+
+    def update(self, audio_path, **entry):
+        with self._lock:
+            self.files[audio_path] = entry
+            write_json_atomic({"files": self.files}, self.path)
+
+def output_dir_for(audio_path, output_root):
+    """A readable, collision-free output directory for an input file."""
+    absolute_path = os.path.abspath(audio_path)
+    stem = os.path.splitext(os.path.basename(absolute_path))[0]
+    digest = hashlib.sha1(absolute_path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(output_root, f"{stem}-{digest}")
+
+def process_file(audio_path, args, voice_mapping):
+    """Translates and synthesizes one file. Returns its manifest entry."""
+    output_dir = output_dir_for(audio_path, args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    with job_trace(os.path.basename(output_dir), output_dir if args.trace else None):
+        segments_data = process_diarization_and_translation(
+            audio_path, args.num_speakers, args.source, args.target, plan_options=plan_options_from_args(args)
+        )
+        write_json_atomic(segments_data, os.path.join(output_dir, "transcript.json"))
+        write_srt(segments_data, os.path.join(output_dir, "transcript.srt"))
+
+        audio_output = None
+        if not args.transcript_only and segments_data:
+            speakers = sorted({segment["speaker"] for segment in segments_data})
+            mapping = {speaker: voice_mapping.get(speaker, args.default_voice) for speaker in speakers}
+            audio_output = synthesize_and_combine(segments_data, mapping, voices_dir=args.voices_dir, output_dir=output_dir)
+
+    processing_seconds = time.perf_counter() - started
+    audio_seconds = get_audio_duration(audio_path)
+    if audio_seconds is None:
+        audio_seconds = max((segment["end"] for segment in segments_data), default=0.0)
+    return {
+        "status": "done",
+        "output_dir": output_dir,
+        "audio_output": audio_output,
+        "segments": len(segments_data),
+        "audio_seconds": audio_seconds,
+        "processing_seconds": processing_seconds,
+    }
+
+def plan_options_from_args(args):
+    """Segment planner thresholds (see segment_planner.plan_segments) from the command line."""
+    return {
+        "max_gap": args.merge_gap,
+        "min_duration": args.min_segment,
+        "max_duration": args.max_segment,
+        "short_policy": SHORT_DROP if args.drop_short else SHORT_ABSORB,
+    }
+
+def parse_voice_mapping(args):
+    voice_mapping = {}
+    if args.voice_map:
+        with open(args.voice_map, encoding="utf-8") as voice_map_file:
+            voice_mapping.update(json.load(voice_map_file))
+    for assignment in args.voice:
+        speaker, separator, voice_name = assignment.partition("=")
+        if not separator:
+            raise SystemExit(f"Invalid --voice '{assignment}', expected SPEAKER=VOICE.")
+        voice_mapping[speaker] = voice_name
+    return voice_mapping
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a batch of recordings without the web UI.")
+    parser.add_argument("inputs", nargs="+", help="Input files or glob patterns (quote them; ** is recursive).")
+    parser.add_argument("--source", required=True, help="Source language code, e.g. en.")
+    parser.add_argument("--target", required=True, help="Target language code, e.g. fr.")
+    parser.add_argument("--num-speakers", type=int, default=2)
+    parser.add_argument("--voice", action="append", default=[], metavar="SPEAKER=VOICE",
+                        help="Piper voice for a diarized speaker label, e.g. SPEAKER_00=fr_FR-siwis-medium.")
+    parser.add_argument("--voice-map", help="JSON file mapping speaker labels to Piper voices.")
+    parser.add_argument("--default-voice", help="Piper voice for speakers without an explicit mapping.")
+    parser.add_argument("--voices-dir", default="voices")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--manifest", help="Manifest path (default: <output-dir>/manifest.json).")
+    parser.add_argument("--restart", action="store_true", help="Ignore the manifest and process every file again.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of files processed at the same time.")
+    parser.add_argument("--transcript-only", action="store_true", help="Skip speech synthesis.")
+    parser.add_argument("--max-segment", type=float, default=MAX_SEGMENT_SECONDS,
+                        help="Segments longer than this many seconds are split before translation.")
+    parser.add_argument("--min-segment", type=float, default=MIN_SEGMENT_SECONDS,
+                        help="Shorter fragments are joined to a nearby segment of the same speaker.")
+    parser.add_argument("--merge-gap", type=float, default=MAX_MERGE_GAP_SECONDS,
+                        help="Same-speaker turns separated by at most this many seconds are merged.")
+    parser.add_argument("--drop-short", action="store_true",
+                        help="Drop fragments shorter than --min-segment instead of keeping them.")
+    parser.add_argument("--trace", action="store_true", help="Write the timing spans of each file to trace-<name>.json.")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port while running.")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Interface of the metrics endpoint (0.0.0.0 for all).")
+    args = parser.parse_args()
+
+    supported_codes = set(get_supported_languages().values())
+    for code in (args.source, args.target):
+        if code not in supported_codes:
+            raise SystemExit(f"Unsupported language code '{code}'.")
+    if args.source != "en" and args.target != "en":
+        raise SystemExit("Translation is only supported to/from English with Canary-1b-v2.")
+
+    voice_mapping = parse_voice_mapping(args)
+    if not args.transcript_only and not voice_mapping and not args.default_voice:
+        raise SystemExit("Give at least --default-voice, --voice or --voice-map (or use --transcript-only).")
+
+    for voice_name in {*voice_mapping.values(), args.default_voice} - {None}:
+        if not args.transcript_only and not os.path.exists(os.path.join(args.voices_dir, f"{voice_name}.onnx")):
+            raise SystemExit(f"Voice '{voice_name}' is not installed in '{args.voices_dir}'.")
+
+    audio_paths = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.isfile(pattern) else [])
+        audio_paths.extend(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    audio_paths = list(dict.fromkeys(audio_paths))
+    if not audio_paths:
+        raise SystemExit("No input files matched.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = Manifest(args.manifest or os.path.join(args.output_dir, "manifest.json"))
+    pending = [path for path in audio_paths if args.restart or not manifest.is_done(path)]
+    print(f"{len(audio_paths)} file(s) found, {len(audio_paths) - len(pending)} already done, {len(pending)} to process.")
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+
+    # The models are shared by all workers; load them while the first files are decoded.
+    start_background_warmup()
+
+    started = time.perf_counter()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(process_file, path, args, voice_mapping): path for path in pending}
+        for future in as_completed(futures):
+            audio_path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failures += 1
+                manifest.update(audio_path, status="failed", error=str(e))
+                print(f"FAILED {audio_path}: {e}", file=sys.stderr)
+                continue
+            manifest.update(audio_path, **entry)
+            rtf = entry["processing_seconds"] / entry["audio_seconds"] if entry["audio_seconds"] else 0.0
+            print(f"done   {audio_path} ({entry['segments']} segments, RTF {rtf:.3f})")
+    wall_seconds = time.perf_counter() - started
+
+    done = [manifest.files[path] for path in pending if manifest.files.get(path, {}).get("status") == "done"]
+    audio_seconds = sum(entry["audio_seconds"] for entry in done)
+    processing_seconds = sum(entry["processing_seconds"] for entry in done)
+    print(f"\nProcessed {len(done)} file(s), {failures} failure(s), {audio_seconds / 3600:.2f} h of audio in {wall_seconds:.1f} s.")
+    if audio_seconds:
+        # Wall-clock RTF accounts for the parallelism; per-file RTF is the average cost of one file.
+        print(f"Aggregate real-time factor: {wall_seconds / audio_seconds:.4f} (wall clock), "
+              f"{processing_seconds / audio_seconds:.4f} (sum of per-file times)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+# benchmark.py
+"""
+Performance benchmarks for the translation pipeline.
+
+Usage:
+    python benchmark.py timeline [--counts 250 500 1000 2000 4000] [--legacy]
+    python benchmark.py startup [--import-delay 2.0] [--load-delay 5.0]
+    python benchmark.py pipeline [--duration 600] [--segments 200] [--speakers 3] [--output run.json]
+    python benchmark.py compare baseline.json candidate.json
+    python benchmark.py cpu-profile recording.wav [--voice voices/fr_FR-siwis-medium.onnx] [--output cpu.json]
+"""
+import os
+import sys
+import json
+import wave
+import shutil
+import argparse
+import platform
+import tempfile
+import time
+import numpy as np
+
+from timeline import OVERLAP_POLICIES, assemble_timeline, read_wav, resample, to_float32
+
+def make_synthetic_clips(count, sample_rate=22050, seed=0):
+    """Builds `count` clips of 1-4 s of noise, spaced like a conversation with occasional overlaps."""
+    rng = np.random.default_rng(seed)
+    clips = []
+    start = 0.0
+    for _ in range(count):
+        duration = rng.uniform(1.0, 4.0)
+        samples = (rng.standard_normal(int(duration * sample_rate)) * 3000).astype(np.int16)
+        clips.append((start, samples))
+        start += duration + rng.uniform(-0.5, 1.5)
+    return clips
+
+def _legacy_assemble(clips, sample_rate):
+    """The previous pydub implementation, re-copying the whole buffer on every append."""
+    from pydub import AudioSegment
+
+    final_audio = AudioSegment.empty()
+    last_segment_end_time = 0.0
+    for start, samples in clips:
+        silence_duration = (start - last_segment_end_time) * 1000
+        if silence_duration > 0:
+            final_audio += AudioSegment.silent(duration=silence_duration, frame_rate=sample_rate)
+        chunk = AudioSegment(samples.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
+        final_audio += chunk
+        last_segment_end_time = start + chunk.duration_seconds
+    return final_audio
+
+def _time(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def benchmark_timeline(args):
+    sample_rate = 22050
+    print(f"{'segments':>9} {'policy':>7} {'total (s)':>10} {'per segment (us)':>17}")
+    for count in args.counts:
+        clips = make_synthetic_clips(count, sample_rate)
+        for overlap in OVERLAP_POLICIES:
+            elapsed = _time(lambda: assemble_timeline(clips, sample_rate, overlap), args.repeats)
+            print(f"{count:>9} {overlap:>7} {elapsed:>10.4f} {elapsed / count * 1e6:>17.1f}")
+        if args.legacy:
+            elapsed = _time(lambda: _legacy_assemble(clips, sample_rate), 1)
+            print(f"{count:>9} {'legacy':>7} {elapsed:>10.4f} {elapsed / count * 1e6:>17.1f}")
+    print("A constant 'per segment' column means the cost grows linearly with the segment count.")
+
+def benchmark_startup(args):
+    """
+    Times `import utils` and the first model loads with stubbed torch/NeMo/pyannote/Piper
+    modules whose import and load costs are simulated with sleeps.
+    """
+    from stub_models import install_stub_modules, uninstall_stub_modules
+
+    if "utils" in sys.modules:
+        raise RuntimeError("utils is already imported; run the startup benchmark in a fresh interpreter.")
+    imported = install_stub_modules(import_delay=args.import_delay, load_delay=args.load_delay)
+    try:
+        started = time.perf_counter()
+        import utils
+        import_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        utils.get_supported_languages()
+        utils.get_piper_voices()
+        helpers_seconds = time.perf_counter() - started
+        imported_at_startup = list(imported)
+
+        started = time.perf_counter()
+        for thread in utils.start_background_warmup():
+            thread.join()
+        warmup_seconds = time.perf_counter() - started
+        status = utils.get_model_status()
+    finally:
+        uninstall_stub_modules()
+        sys.modules.pop("utils", None)
+
+    eager_seconds = 3 * args.import_delay + 2 * args.load_delay
+    print(f"Simulated costs: {args.import_delay:.1f}s per heavy import, {args.load_delay:.1f}s per model load")
+    print(f"import utils:                     {import_seconds:8.3f}s")
+    print(f"get_supported_languages + voices: {helpers_seconds:8.3f}s")
+    print(f"heavy modules imported so far:    {', '.join(imported_at_startup) or 'none'}")
+    print(f"background warm-up until ready:   {warmup_seconds:8.3f}s ({status})")
+    print(f"eager sequential loading (est.):  {eager_seconds:8.3f}s before the UI could render")
+
+# --- End-to-end pipeline ---
+def write_synthetic_conversation(path, duration, segments, speakers, sample_rate=44100, seed=0):
+    """
+    Writes a stereo WAV of about `duration` seconds with `segments` speech-like turns
+    (a speaker-specific tone plus noise) separated by silences. Returns the real duration.
+    The file is written turn by turn, so long recordings do not need to fit in memory.
+    """
+    rng = np.random.default_rng(seed)
+    mean_turn = duration / segments
+    with wave.open(path, "wb") as writer:
+        writer.setnchannels(2)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        frames = 0
+        for i in range(segments):
+            gap = rng.uniform(0.4, 1.2)
+            length = max(0.3, mean_turn * rng.uniform(0.5, 1.5) - gap)
+            frequency = 140 + 60 * (i % speakers)
+            t = np.arange(int(length * sample_rate)) / sample_rate
+            speech = 0.3 * np.sin(2 * np.pi * frequency * t) + 0.05 * rng.standard_normal(len(t))
+            signal = np.concatenate([np.zeros(int(gap * sample_rate)), speech])
+            pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+            writer.writeframes(np.repeat(pcm, 2).tobytes())
+            frames += len(pcm)
+    return frames / sample_rate
+
+def _wave_load_audio(audio_path, sample_rate=16000):
+    """Decoder used when FFmpeg is not available: reads PCM WAV with the wave module."""
+    samples, rate = read_wav(audio_path)
+    return resample(to_float32(samples), rate, sample_rate)
+
+def _wave_stream_audio(audio_path, block_seconds, sample_rate=16000):
+    """Streaming counterpart of _wave_load_audio: only one block is held in memory at a time."""
+    with wave.open(audio_path, "rb") as reader:
+        if reader.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported.")
+        rate = reader.getframerate()
+        channels = reader.getnchannels()
+        frames_per_block = max(1, int(block_seconds * rate))
+        # Resampling works on pieces of at most 10 s, so its float64 temporaries stay small.
+        frames_per_piece = min(frames_per_block, 10 * rate)
+        while True:
+            pieces = []
+            remaining = frames_per_block
+            while remaining > 0:
+                samples = np.frombuffer(reader.readframes(min(remaining, frames_per_piece)), dtype=np.int16)
+                if not len(samples):
+                    break
+                if channels > 1:
+                    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                pieces.append(resample(to_float32(samples), rate, sample_rate))
+                remaining -= len(samples)
+            if not pieces:
+                break
+            yield np.concatenate(pieces)
+
+def peak_rss_mb():
+    """Peak resident set size of this process, in MB."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / 1024 / 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+class StageTimer:
+    """Wraps functions so that the time spent in them is accumulated per stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+                entry["seconds"] += time.perf_counter() - started
+                entry["calls"] += 1
+        return timed
+
+    def wrap_generator(self, stage, fn):
+        """Like wrap(), for generators: only the time spent producing items is counted."""
+        def timed(*args, **kwargs):
+            iterator = fn(*args, **kwargs)
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+                    entry["seconds"] += time.perf_counter() - started
+                    entry["calls"] += 1
+                yield item
+        return timed
+
+def benchmark_pipeline(args):
+    """
+    Runs utils' full pipeline (decode, diarization, planning, translation, synthesis,
+    export) on synthetic audio with stub models, and reports per-stage wall time,
+    real-time factor, peak RSS and model call counts.
+    """
+    from stub_models import (
+        StubCanaryModel, StubDiarizationPipeline, StubPiperVoice, install_stub_modules, uninstall_stub_modules
+    )
+
+    if "utils" in sys.modules:
+        raise RuntimeError("utils is already imported; run the pipeline benchmark in a fresh interpreter.")
+    canary = StubCanaryModel(seconds_per_call=args.canary_call_ms / 1000, seconds_per_audio_second=args.canary_rtf)
+    diarization = StubDiarizationPipeline(seconds_per_audio_second=args.diarization_rtf)
+    StubPiperVoice.seconds_per_call = args.piper_call_ms / 1000
+    install_stub_modules(canary_model=canary, diarization_pipeline=diarization, voice_class=StubPiperVoice)
+
+    workdir = tempfile.mkdtemp(prefix="v2v-benchmark-")
+    try:
+        import utils
+
+        utils.TRANSLATION_CACHE_ENABLED = False
+        audio_path = os.path.join(workdir, "conversation.wav")
+        audio_seconds = write_synthetic_conversation(audio_path, args.duration, args.segments, args.speakers)
+
+        voices_dir = os.path.join(workdir, "voices")
+        os.makedirs(voices_dir)
+        voice_mapping = {}
+        for i in range(args.speakers):
+            voice_name = f"xx_XX-stub{i}-medium"
+            open(os.path.join(voices_dir, f"{voice_name}.onnx"), "wb").close()
+            voice_mapping[f"SPEAKER_{i:02d}"] = voice_name
+
+        decoder = "ffmpeg"
+        if shutil.which("ffmpeg") is None:
+            decoder = "wave (FFmpeg not found)"
+            utils.load_audio = _wave_load_audio
+            utils.stream_audio = _wave_stream_audio
+            utils.get_audio_duration = lambda path: audio_seconds
+
+        timer = StageTimer()
+        utils.load_audio = timer.wrap("decode", utils.load_audio)
+        utils.stream_audio = timer.wrap_generator("decode", utils.stream_audio)
+        utils._diarize = timer.wrap("diarization", utils._diarize)
+        utils.plan_segments = timer.wrap("planning", utils.plan_segments)
+        utils.translate_segments = timer.wrap("translation", utils.translate_segments)
+        utils.synthesize_segments = timer.wrap("synthesis", utils.synthesize_segments)
+        utils.assemble_timeline = timer.wrap("export", utils.assemble_timeline)
+        utils.write_wav = timer.wrap("export", utils.write_wav)
+
+        started = time.perf_counter()
+        segments_data = utils.process_diarization_and_translation(
+            audio_path, args.speakers, "en", "fr", long_audio=args.long_audio, plan=not args.no_plan
+        )
+        utils.synthesize_and_combine(
+            segments_data, voice_mapping, voices_dir=voices_dir,
+            num_workers=args.synthesis_workers, output_dir=os.path.join(workdir, "output")
+        )
+        total_seconds = time.perf_counter() - started
+    finally:
+        uninstall_stub_modules()
+        sys.modules.pop("utils", None)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stages = {
+        name: {**entry, "rtf": entry["seconds"] / audio_seconds}
+        for name, entry in timer.stages.items()
+    }
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("func", "output")},
+        "decoder": decoder,
+        "audio_seconds": audio_seconds,
+        "segments": len(segments_data),
+        "total_seconds": total_seconds,
+        "rtf": total_seconds / audio_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+        "model_calls": {
+            "diarization": diarization.calls,
+            "canary_batches": len(canary.batch_sizes),
+            "canary_segments": sum(canary.batch_sizes),
+            "piper_syntheses": StubPiperVoice.calls_total,
+            "piper_loads": StubPiperVoice.loads,
+        },
+    }
+
+    print(f"Audio: {audio_seconds:.1f}s, {len(segments_data)} segments (decoder: {decoder})")
+    print(f"{'stage':<12} {'seconds':>9} {'calls':>6} {'RTF':>8}")
+    for name, entry in stages.items():
+        print(f"{name:<12} {entry['seconds']:>9.3f} {entry['calls']:>6} {entry['rtf']:>8.4f}")
+    print(f"{'total':<12} {total_seconds:>9.3f} {'':>6} {result['rtf']:>8.4f}")
+    print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB")
+    print(f"Model calls: {result['model_calls']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file, indent=2)
+        print(f"Results saved to {args.output}")
+    return result
+
+def compare_results(args):
+    """Prints the per-stage differences between two saved pipeline benchmark runs."""
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.candidate, encoding="utf-8") as candidate_file:
+        candidate = json.load(candidate_file)
+
+    def row(name, before, after, unit="s"):
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<24} {before:>10.3f}{unit} {after:>10.3f}{unit} {change:>+8.1f}%")
+
+    print(f"{'':<24} {'baseline':>11} {'candidate':>11} {'change':>9}")
+    for name in dict.fromkeys([*baseline["stages"], *candidate["stages"]]):
+        row(name, baseline["stages"].get(name, {}).get("seconds", 0.0), candidate["stages"].get(name, {}).get("seconds", 0.0))
+    row("total", baseline["total_seconds"], candidate["total_seconds"])
+    row("rtf", baseline["rtf"], candidate["rtf"], unit=" ")
+    row("peak RSS (MB)", baseline["peak_rss_mb"], candidate["peak_rss_mb"], unit=" ")
+    for name in dict.fromkeys([*baseline["model_calls"], *candidate["model_calls"]]):
+        row(f"calls: {name}", baseline["model_calls"].get(name, 0), candidate["model_calls"].get(name, 0), unit=" ")
+
+# --- CPU inference profile ---
+def _timed_translation(utils, model, waveforms, source, target):
+    # One untimed call first, so one-time initialization is not counted.
+    utils.translate_segments(waveforms[:1], source, target, model=model)
+    started = time.perf_counter()
+    texts = utils.translate_segments(waveforms, source, target, model=model)
+    return texts, time.perf_counter() - started
+
+def _timed_synthesis(utils, voice, texts):
+    utils.synthesize_segment(voice, texts[0])
+    started = time.perf_counter()
+    outputs = [utils.synthesize_segment(voice, text)[0] for text in texts]
+    return outputs, time.perf_counter() - started
+
+def _run_profile(profile_name, waveforms, source, target, voice_path=None, piper_texts=None):
+    """
+    Runs Canary (and Piper with `voice_path`) under one inference profile, on the CPU.
+    Meant for a fresh process: torch's inter-op thread count can only be set before
+    torch runs any parallel work.
+    """
+    import torch
+    import utils
+
+    profile = utils.get_inference_profile(profile_name)
+    utils.apply_thread_settings(profile)
+    utils._device = torch.device("cpu")
+    run = {"threads": [torch.get_num_threads(), torch.get_num_interop_threads()], "quantize_seconds": 0.0}
+
+    model = utils.load_canary_model(utils.get_inference_profile("default"))
+    if profile["quantize_canary"]:
+        started = time.perf_counter()
+        model = utils.quantize_canary(model)
+        run["quantize_seconds"] = time.perf_counter() - started
+    run["texts"], run["canary_seconds"] = _timed_translation(utils, model, waveforms, source, target)
+    del model
+
+    piper_texts = piper_texts or [text for text in run["texts"] if text.strip()]
+    if voice_path and piper_texts:
+        voice = utils._load_piper_model(voice_path, profile)
+        run["piper_outputs"], run["piper_seconds"] = _timed_synthesis(utils, voice, piper_texts)
+    return run
+
+def benchmark_cpu_profile(args):
+    """
+    Compares the "default" and "cpu" inference profiles on the CPU with the real models:
+    Canary latency and translation similarity (full precision vs int8), and, with --voice,
+    Piper latency and output difference (default vs tuned ONNX Runtime sessions).
+    Each profile runs in its own process so that its thread settings fully apply.
+    """
+    import difflib
+    import multiprocessing
+    from utils import SAMPLE_RATE, load_audio
+
+    audio = load_audio(args.audio)[:int(args.max_seconds * SAMPLE_RATE)]
+    step = int(args.segment_seconds * SAMPLE_RATE)
+    waveforms = [audio[i:i + step] for i in range(0, len(audio), step) if len(audio) - i >= SAMPLE_RATE]
+    audio_seconds = len(audio) / SAMPLE_RATE
+    print(f"Audio: {audio_seconds:.1f}s in {len(waveforms)} segments of {args.segment_seconds:.0f}s")
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        default_run = pool.apply(_run_profile, ("default", waveforms, args.source, args.target, args.voice))
+        texts = [text for text in default_run["texts"] if text.strip()]
+        cpu_run = pool.apply(_run_profile, ("cpu", waveforms, args.source, args.target, args.voice, texts))
+    default_texts, default_seconds = default_run["texts"], default_run["canary_seconds"]
+    cpu_texts, cpu_seconds = cpu_run["texts"], cpu_run["canary_seconds"]
+
+    similarities = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(default_texts, cpu_texts)]
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "audio_seconds": audio_seconds,
+        "segments": len(waveforms),
+        "threads": {"default": default_run["threads"], "cpu": cpu_run["threads"]},
+        "canary": {
+            "default_seconds": default_seconds,
+            "cpu_seconds": cpu_seconds,
+            "quantize_seconds": cpu_run["quantize_seconds"],
+            "speedup": default_seconds / cpu_seconds if cpu_seconds else 0.0,
+            "mean_text_similarity": float(np.mean(similarities)) if similarities else 1.0,
+            "min_text_similarity": min(similarities, default=1.0),
+            "identical_texts": sum(a == b for a, b in zip(default_texts, cpu_texts)),
+        },
+    }
+
+    if "piper_outputs" in default_run and "piper_outputs" in cpu_run:
+        default_outputs, piper_default_seconds = default_run["piper_outputs"], default_run["piper_seconds"]
+        cpu_outputs, piper_cpu_seconds = cpu_run["piper_outputs"], cpu_run["piper_seconds"]
+        differences = [
+            float(np.abs(a.astype(np.int32) - b.astype(np.int32)).max()) if len(a) == len(b) else float("inf")
+            for a, b in zip(default_outputs, cpu_outputs)
+        ]
+        result["piper"] = {
+            "default_seconds": piper_default_seconds,
+            "cpu_seconds": piper_cpu_seconds,
+            "speedup": piper_default_seconds / piper_cpu_seconds if piper_cpu_seconds else 0.0,
+            "same_length_outputs": sum(difference != float("inf") for difference in differences),
+            "max_sample_difference": max((d for d in differences if d != float("inf")), default=0.0),
+        }
+
+    print(f"{'':<10} {'default (s)':>12} {'cpu (s)':>9} {'speedup':>8}")
+    for name in ("canary", "piper"):
+        if name in result:
+            entry = result[name]
+            print(f"{name:<10} {entry['default_seconds']:>12.3f} {entry['cpu_seconds']:>9.3f} {entry['speedup']:>7.2f}x")
+    canary = result["canary"]
+    print(f"Canary int8 quantization took {canary['quantize_seconds']:.1f}s; translation similarity "
+          f"mean {canary['mean_text_similarity']:.3f}, min {canary['min_text_similarity']:.3f}, "
+          f"{canary['identical_texts']}/{len(waveforms)} identical")
+    if "piper" in result:
+        print(f"Piper: {result['piper']['same_length_outputs']}/{len(texts)} outputs of equal length, "
+              f"max sample difference {result['piper']['max_sample_difference']:.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file, indent=2)
+        print(f"Results saved to {args.output}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the voice-to-voice translation pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    timeline_parser = subparsers.add_parser("timeline", help="Scaling of the output timeline assembler.")
+    timeline_parser.add_argument("--counts", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    timeline_parser.add_argument("--repeats", type=int, default=3)
+    timeline_parser.add_argument("--legacy", action="store_true", help="Also time the old pydub concatenation (slow).")
+    timeline_parser.set_defaults(func=benchmark_timeline)
+
+    startup_parser = subparsers.add_parser("startup", help="Import time of utils and model warm-up, with stubbed models.")
+    startup_parser.add_argument("--import-delay", type=float, default=2.0, help="Simulated seconds per heavy package import.")
+    startup_parser.add_argument("--load-delay", type=float, default=5.0, help="Simulated seconds per model load.")
+    startup_parser.set_defaults(func=benchmark_startup)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="End-to-end pipeline on synthetic audio with stub models.")
+    pipeline_parser.add_argument("--duration", type=float, default=600.0, help="Approximate audio length in seconds.")
+    pipeline_parser.add_argument("--segments", type=int, default=200, help="Number of speech turns.")
+    pipeline_parser.add_argument("--speakers", type=int, default=3)
+    pipeline_parser.add_argument("--long-audio", action="store_true", help="Use windowed diarization.")
+    pipeline_parser.add_argument("--no-plan", action="store_true", help="Skip the segment planner.")
+    pipeline_parser.add_argument("--synthesis-workers", type=int, default=None)
+    pipeline_parser.add_argument("--canary-call-ms", type=float, default=50.0, help="Simulated cost of one Canary batch.")
+    pipeline_parser.add_argument("--canary-rtf", type=float, default=0.01, help="Simulated Canary seconds per audio second.")
+    pipeline_parser.add_argument("--diarization-rtf", type=float, default=0.01, help="Simulated pyannote seconds per audio second.")
+    pipeline_parser.add_argument("--piper-call-ms", type=float, default=5.0, help="Simulated cost of one Piper synthesis.")
+    pipeline_parser.add_argument("--output", help="Save the results as JSON.")
+    pipeline_parser.set_defaults(func=benchmark_pipeline)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two saved pipeline results.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(func=compare_results)
+
+    cpu_parser = subparsers.add_parser("cpu-profile", help="Default vs \"cpu\" inference profile with the real models.")
+    cpu_parser.add_argument("audio", help="A speech recording.")
+    cpu_parser.add_argument("--source", default="en")
+    cpu_parser.add_argument("--target", default="fr")
+    cpu_parser.add_argument("--max-seconds", type=float, default=120.0, help="Only use the start of the recording.")
+    cpu_parser.add_argument("--segment-seconds", type=float, default=10.0)
+    cpu_parser.add_argument("--voice", help="Path of a Piper .onnx voice to compare synthesis too.")
+    cpu_parser.add_argument("--output", help="Save the results as JSON.")
+    cpu_parser.set_defaults(func=benchmark_cpu_profile)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+def segment_key(samples, *parts):
+    """Content address of a segment: SHA-256 of its PCM samples plus any extra key parts."""
+    digest = hashlib.sha256(np.ascontiguousarray(samples).tobytes())
+    for part in parts:
+        digest.update(b"\0" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+class TranslationCache:
+    """
+    Persistent SQLite cache of Canary outputs, keyed by segment_key(samples, source_lang,
+    target_lang, model_id). When the stored texts exceed `max_bytes`, the least
+    recently used entries are deleted.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS translations_last_access ON translations (last_access)")
+
+    def get_many(self, keys):
+        """Returns {key: text} for the keys that are cached and marks them as recently used."""
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock, self._connection:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well below SQLite's limit on the number of query parameters.
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, text FROM translations WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+                self._connection.execute(
+                    f"UPDATE translations SET last_access = ? WHERE key IN ({placeholders})", [now, *chunk]
+                )
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        """Stores {key: text} and evicts old entries if the cache grew past max_bytes."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, text, len(key) + len(text.encode("utf-8")), now) for key, text in items.items()]
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+
+    def _evict(self):
+        total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        # Delete the oldest entries until the cache is back under budget.
+        excess = total_bytes - self.max_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in self._connection.execute("SELECT key, size FROM translations ORDER BY last_access"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._connection.executemany("DELETE FROM translations WHERE key = ?", stale_keys)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM translations")
+
+    def stats(self):
+        with self._lock:
+            count, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total_bytes, "max_bytes": self.max_bytes}
+
+class SynthesisCache:
+    """
+    In-memory LRU cache of synthesized segments. Keys combine the text with the voice
+    and its file version (see voice_file_version), so replacing a voice on disk
+    invalidates its segments. Holds at most `max_bytes` of samples.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (samples, sample_rate)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, samples, sample_rate):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[0].nbytes
+            self._entries[key] = (samples, sample_rate)
+            self._total_bytes += samples.nbytes
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+def voice_file_version(voice_name, voices_dir="voices"):
+    """Identifies the installed version of a voice by the mtime and size of its .onnx file."""
+    stat = os.stat(os.path.join(voices_dir, f"{voice_name}.onnx"))
+    return (stat.st_mtime_ns, stat.st_size)
@@ -1,9 +1,28 @@
 import os
-import sys
-import subprocess
+import json
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from voice_registry import get_registry, index_voice_names, parse_voice_name
 
 VOICES_DIR = "voices"
 
+# Voices are fetched from the Piper voices repository on Hugging Face. Point PIPER_VOICES_URL
+# at a mirror with the same layout (an internal server, or a local http:// or file:// copy)
+# to download from there instead.
+VOICES_BASE_URL = os.environ.get(
+    "PIPER_VOICES_URL", "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0"
+).rstrip("/")
+
+# Number of files downloaded at the same time by download_voices() and prefetch_language().
+DOWNLOAD_WORKERS = int(os.environ.get("VOICE_DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
 def get_all_piper_voice_names():
     """Returns a static list of all known Piper voice names."""
     # This list is based on the output you provided.
@@ -51,50 +70,168 @@ def get_all_piper_voice_names():
         "vi_VN-vivos-x_low", "zh_CN-huayan-medium", "zh_CN-huayan-x_low"
     ]
 
-def download_voice_if_needed(voice_name: str) -> bool:
+# --- Manifest ---
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_voices_manifest():
     """
-    Checks if a voice exists locally. If not, downloads it directly
-    to the correct directory using Piper's download module.
-    Returns True on success or if the voice already exists, False on failure.
+    Returns the voices.json manifest of the repository (file paths, sizes and MD5 digests),
+    or {} if it cannot be fetched, in which case downloads are not verified.
+    A copy is kept in VOICES_DIR so that it is only fetched once.
     """
-    if not voice_name:
-        return False
+    global _manifest
+    with _manifest_lock:
+        if _manifest is not None:
+            return _manifest
+        cached_path = os.path.join(VOICES_DIR, "voices.json")
+        try:
+            with urllib.request.urlopen(f"{VOICES_BASE_URL}/voices.json", timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+                data = response.read()
+            _manifest = json.loads(data)
+            os.makedirs(VOICES_DIR, exist_ok=True)
+            with open(f"{cached_path}.part", "wb") as manifest_file:
+                manifest_file.write(data)
+            os.replace(f"{cached_path}.part", cached_path)
+        except (OSError, ValueError) as e:
+            if os.path.exists(cached_path):
+                with open(cached_path, encoding="utf-8") as manifest_file:
+                    _manifest = json.load(manifest_file)
+            else:
+                print(f"Warning: cannot fetch the voices manifest ({e}); downloads will not be verified.")
+                _manifest = {}
+        return _manifest
 
-    os.makedirs(VOICES_DIR, exist_ok=True)
+def _voice_files(voice_name):
+    """Returns [(path in the repository, size or None, md5 or None)] for the .onnx and .onnx.json files."""
+    entry = get_voices_manifest().get(voice_name)
+    if entry and entry.get("files"):
+        files = [
+            (path, info.get("size_bytes"), info.get("md5_digest"))
+            for path, info in entry["files"].items()
+            if path.endswith((".onnx", ".onnx.json"))
+        ]
+    else:
+        language, locale, name, quality = parse_voice_name(voice_name)
+        folder = f"{language}/{locale}/{name}/{quality}"
+        files = [(f"{folder}/{voice_name}.onnx", None, None), (f"{folder}/{voice_name}.onnx.json", None, None)]
+    # The config is written last: a voice counts as installed once both files are present.
+    return sorted(files, key=lambda file: file[0].endswith(".json"))
+
+# --- Downloads ---
+def _md5_of(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as part_file:
+        for block in iter(lambda: part_file.read(DOWNLOAD_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _finish_part(url, part_path, destination, expected_size=None, expected_md5=None, discard_incomplete=False):
+    """Checks a downloaded .part file and moves it into place, or raises (removing it if it is unusable)."""
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size or discard_incomplete:
+            os.remove(part_path)
+        raise IOError(f"incomplete download of {url} ({size} of {expected_size} bytes)")
+    if expected_md5 and _md5_of(part_path) != expected_md5:
+        os.remove(part_path)
+        raise IOError(f"checksum mismatch for {url}")
+    os.replace(part_path, destination)
 
-    onnx_path = os.path.join(VOICES_DIR, f"{voice_name}.onnx")
-    json_path = os.path.join(VOICES_DIR, f"{voice_name}.onnx.json")
+def _total_size(headers, offset=0):
+    """The full size of the file from a response's Content-Range or Content-Length, or None."""
+    content_range = headers.get("Content-Range", "")
+    if "/" in content_range and content_range.rsplit("/", 1)[1].strip().isdigit():
+        return int(content_range.rsplit("/", 1)[1])
+    content_length = headers.get("Content-Length", "")
+    return offset + int(content_length) if content_length.strip().isdigit() else None
 
-    if os.path.exists(onnx_path) and os.path.exists(json_path):
-        print(f"Voice '{voice_name}' already exists locally.")
-        return True
+def _download_file(url, destination, expected_size=None, expected_md5=None):
+    """
+    Downloads `url` to `destination` through a .part file, resuming a previous partial
+    download when the server supports range requests. The file is checked against
+    `expected_size` and `expected_md5` and only then moved into place. Without an expected
+    size, the size announced by the server is used, so a connection that drops mid-body
+    leaves the .part file to be resumed instead of installing a truncated file.
+    """
+    part_path = f"{destination}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if expected_size is not None and offset > expected_size:
+        offset = 0
+    if offset and offset == expected_size:
+        # The previous run stopped between the last write and the rename.
+        return _finish_part(url, part_path, destination, expected_size, expected_md5, discard_incomplete=True)
 
-    print(f"Downloading voice '{voice_name}'...")
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
     try:
-        # KEY MODIFICATION: The correct argument is --download-dir, not --voices-dir
-        command = [
-            sys.executable, "-m", "piper.download_voices",
-            "--download-dir", VOICES_DIR,  # <- FIXED
-            voice_name
-        ]
-        
-        # Using capture_output=True to avoid cluttering the main console on success
-        result = subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
+        response = urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # Nothing left after `offset`: the .part file is either complete or stale.
+        if expected_size is None:
+            expected_size = _total_size(e.headers or {})
+        return _finish_part(url, part_path, destination, expected_size, expected_md5, discard_incomplete=True)
+    with response:
+        if offset and getattr(response, "status", None) != 206:
+            offset = 0  # The server ignored the range: start over.
+        if expected_size is None:
+            expected_size = _total_size(response.headers, offset)
+        with open(part_path, "ab" if offset else "wb") as part_file:
+            for block in iter(lambda: response.read(DOWNLOAD_CHUNK_BYTES), b""):
+                part_file.write(block)
+    _finish_part(url, part_path, destination, expected_size, expected_md5)
 
-        if os.path.exists(onnx_path) and os.path.exists(json_path):
-            print(f"Voice '{voice_name}' was successfully downloaded to '{VOICES_DIR}'.")
+_voice_locks = {}
+_voice_locks_lock = threading.Lock()
+
+def _voice_lock(voice_name):
+    with _voice_locks_lock:
+        return _voice_locks.setdefault(voice_name, threading.Lock())
+
+def download_voice_if_needed(voice_name: str) -> bool:
+    """
+    Checks if a voice exists locally. If not, downloads its .onnx model and .onnx.json
+    config into VOICES_DIR. Returns True on success or if the voice already exists,
+    False on failure.
+    """
+    if not voice_name:
+        return False
+
+    registry = get_registry(VOICES_DIR)
+    # Concurrent requests for the same voice wait for the first download instead of repeating it.
+    with _voice_lock(voice_name):
+        if registry.is_installed(voice_name):
             return True
-        else:
-            print(f"Error: Download seemed to succeed, but voice files for '{voice_name}' are not found.")
-            print(f"Download script output: {result.stdout}\n{result.stderr}")
+
+        os.makedirs(VOICES_DIR, exist_ok=True)
+        print(f"Downloading voice '{voice_name}'...")
+        try:
+            for path, size, md5 in _voice_files(voice_name):
+                destination = os.path.join(VOICES_DIR, os.path.basename(path))
+                if os.path.exists(destination) and (size is None or os.path.getsize(destination) == size):
+                    continue
+                _download_file(f"{VOICES_BASE_URL}/{urllib.parse.quote(path)}", destination, size, md5)
+        except (OSError, urllib.error.URLError) as e:
+            print(f"Error while downloading voice '{voice_name}': {e}")
             return False
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error while downloading voice '{voice_name}'.")
-        print(f"Command: {' '.join(e.cmd)}")
-        print(f"Output: {e.stdout}")
-        print(f"Error: {e.stderr}")
-        return False
-    except Exception as e:
-        print(f"An unexpected error occurred during download: {e}")
-        return False
\ No newline at end of file
+    print(f"Voice '{voice_name}' was successfully downloaded to '{VOICES_DIR}'.")
+    return True
+
+def download_voices(voice_names, max_workers=DOWNLOAD_WORKERS):
+    """Downloads several voices concurrently. Returns {voice_name: success}."""
+    voice_names = list(dict.fromkeys(voice_names))
+    if not voice_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(voice_names)))) as executor:
+        return dict(zip(voice_names, executor.map(download_voice_if_needed, voice_names)))
+
+def prefetch_language(lang_code, quality=None, max_workers=DOWNLOAD_WORKERS):
+    """Downloads every known voice of a language (optionally of one quality). Returns {voice_name: success}."""
+    voice_names = index_voice_names(get_all_piper_voice_names()).get(lang_code, [])
+    if quality:
+        voice_names = [voice_name for voice_name in voice_names if parse_voice_name(voice_name)[3] == quality]
+    return download_voices(voice_names, max_workers)
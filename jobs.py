@@ -0,0 +1,157 @@
+# jobs.py
+import os
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+from metrics import register_collector
+
+# Maximum number of concurrent calls per pipeline stage. Diarization and translation share
+# the GPU, synthesis runs on the CPU. Each can be overridden with an environment variable,
+# e.g. SYNTHESIS_CONCURRENCY=4.
+STAGE_LIMITS = {
+    "diarization": int(os.environ.get("DIARIZATION_CONCURRENCY", "1")),
+    "translation": int(os.environ.get("TRANSLATION_CONCURRENCY", "1")),
+    "synthesis": int(os.environ.get("SYNTHESIS_CONCURRENCY", "2")),
+}
+
+# Per-job working directories, and how long a finished job's files are kept.
+JOBS_DIR = "jobs"
+JOB_RETENTION_SECONDS = 3600
+
+class Job:
+    """A unit of work with its own working directory."""
+
+    def __init__(self, job_id, workspace):
+        self.id = job_id
+        self.workspace = workspace
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def path(self, *parts):
+        return os.path.join(self.workspace, *parts)
+
+class _Stage:
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphore = threading.Semaphore(limit)
+        self.waiting = 0
+        self.running = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+class JobScheduler:
+    """
+    Gives every job an isolated workspace and limits how many jobs run each pipeline
+    stage at once. Callers wait in line for a stage; the wait is recorded per stage.
+    """
+
+    def __init__(self, root=JOBS_DIR, stage_limits=None, retention_seconds=JOB_RETENTION_SECONDS):
+        self.root = root
+        self.retention_seconds = retention_seconds
+        self._stages = {name: _Stage(limit) for name, limit in (stage_limits or STAGE_LIMITS).items()}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # --- Workspaces ---
+    def create_job(self):
+        """Creates a job with an empty working directory, after sweeping expired jobs."""
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        workspace = os.path.join(self.root, job_id)
+        os.makedirs(workspace)
+        job = Job(job_id, workspace)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def finish(self, job):
+        """Marks a job as finished; its files are removed once the retention period has passed."""
+        job.finished_at = time.time()
+
+    def cleanup(self, max_age_seconds=None):
+        """Removes the workspaces of jobs finished more than `max_age_seconds` ago."""
+        max_age_seconds = self.retention_seconds if max_age_seconds is None else max_age_seconds
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at is not None and now - job.finished_at >= max_age_seconds
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.workspace, ignore_errors=True)
+        return len(expired)
+
+    # --- Stages ---
+    @contextmanager
+    def stage(self, name):
+        """Waits for a free slot of stage `name` and holds it for the duration of the block."""
+        stage = self._stages.get(name)
+        if stage is None:
+            yield
+            return
+
+        queued_at = time.perf_counter()
+        with self._lock:
+            stage.waiting += 1
+        stage.semaphore.acquire()
+        wait_seconds = time.perf_counter() - queued_at
+        with self._lock:
+            stage.waiting -= 1
+            stage.running += 1
+            stage.started += 1
+            stage.total_wait_seconds += wait_seconds
+            stage.max_wait_seconds = max(stage.max_wait_seconds, wait_seconds)
+        try:
+            yield
+        finally:
+            with self._lock:
+                stage.running -= 1
+                stage.completed += 1
+            stage.semaphore.release()
+
+    def run(self, name, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) inside stage `name`."""
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def metrics(self):
+        """Per-stage queue depth, running count and wait times, plus the number of tracked jobs."""
+        with self._lock:
+            stages = {
+                name: {
+                    "limit": stage.limit,
+                    "queued": stage.waiting,
+                    "running": stage.running,
+                    "completed": stage.completed,
+                    "average_wait_seconds": stage.total_wait_seconds / stage.started if stage.started else 0.0,
+                    "max_wait_seconds": stage.max_wait_seconds,
+                }
+                for name, stage in self._stages.items()
+            }
+            active_jobs = sum(1 for job in self._jobs.values() if job.finished_at is None)
+            return {"stages": stages, "active_jobs": active_jobs, "tracked_jobs": len(self._jobs)}
+
+# Shared by the pipeline functions in utils and by every entry point.
+scheduler = JobScheduler()
+
+def _collect_metrics():
+    """Queue depth, running count and wait times of each stage, for the metrics endpoint."""
+    metrics = scheduler.metrics()
+    stages = metrics["stages"]
+    by_stage = lambda key: {(("stage", name),): values[key] for name, values in stages.items()}
+    return [
+        ("stage_queued", "gauge", "Calls waiting for a stage slot.", by_stage("queued")),
+        ("stage_running", "gauge", "Calls holding a stage slot.", by_stage("running")),
+        ("stage_limit", "gauge", "Concurrent calls allowed per stage.", by_stage("limit")),
+        ("stage_completed_total", "counter", "Calls that went through a stage.", by_stage("completed")),
+        ("stage_max_wait_seconds", "gauge", "Longest wait for a stage slot.", by_stage("max_wait_seconds")),
+        ("active_jobs", "gauge", "Jobs that have not finished yet.", {(): metrics["active_jobs"]}),
+    ]
+
+register_collector(_collect_metrics)
@@ -0,0 +1,224 @@
+# metrics.py
+"""
+Pipeline instrumentation: timing spans, counters, per-job traces and a Prometheus
+text-format endpoint.
+
+    with span("decode"):
+        ...
+    inc("segments_total", 12, stage="translation")
+
+Spans are recorded in the `v2v_stage_duration_seconds` histogram and, when a job trace
+is active in the current thread (see job_trace), appended to that trace.
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "v2v_"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, plus collectors evaluated at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> (help, {labels: value})
+        self._histograms = {}  # name -> (help, {labels: [bucket counts..., sum, count]})
+        self._collectors = []
+
+    def inc(self, name, value=1, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, values = self._counters.setdefault(name, (help, {}))
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name, value, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, values = self._histograms.setdefault(name, (help, {}))
+            state = values.setdefault(key, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def register_collector(self, collector):
+        """
+        `collector()` is called on every scrape and returns a list of
+        (name, type, help, {labels_dict_as_tuple: value}) for values owned elsewhere,
+        such as cache statistics or queue depths.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = {name: (help, dict(values)) for name, (help, values) in self._counters.items()}
+            histograms = {
+                name: (help, {labels: list(state) for labels, state in values.items()})
+                for name, (help, values) in self._histograms.items()
+            }
+            collectors = list(self._collectors)
+
+        for name, (help, values) in sorted(counters.items()):
+            lines.append(f"# HELP {PREFIX}{name} {help or name}")
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, (help, values) in sorted(histograms.items()):
+            lines.append(f"# HELP {PREFIX}{name} {help or name}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for labels, state in sorted(values.items()):
+                for bound, count in zip(DURATION_BUCKETS, state):
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {state[-1]}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {state[-1]}")
+
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, metric_type, help, values in collected:
+                lines.append(f"# HELP {PREFIX}{name} {help or name}")
+                lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+                for labels, value in sorted(values.items()):
+                    lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+register_collector = registry.register_collector
+
+# --- Traces ---
+class Trace:
+    """The spans recorded for one job, in the order they finished."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, started_at, duration, labels):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start": round(started_at - self.started_at, 6),
+                "duration": round(duration, 6),
+                "thread": threading.current_thread().name,
+                **labels,
+            })
+
+    def to_dict(self):
+        with self._lock:
+            return {"job_id": self.job_id, "started_at": self.started_at, "spans": list(self.spans)}
+
+    def dump(self, directory):
+        """Writes the trace to <directory>/trace-<job_id>.json and returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace-{self.job_id}.json")
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_dict(), trace_file, indent=2)
+        return path
+
+_current_trace = contextvars.ContextVar("v2v_trace", default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+def use_trace(trace):
+    """Makes `trace` the active trace of the current thread (e.g. in a worker thread)."""
+    _current_trace.set(trace)
+
+@contextmanager
+def job_trace(job_id, dump_dir=None):
+    """Records the spans of the enclosed block in a Trace, dumped to `dump_dir` if given."""
+    trace = Trace(job_id)
+    previous = _current_trace.get()
+    _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.set(previous)
+        if dump_dir:
+            trace.dump(dump_dir)
+
+def traced_iter(iterator, trace):
+    """
+    Iterates over a generator with `trace` active while it runs. Unlike job_trace, this
+    works when the consumer resumes the generator from different threads.
+    """
+    while True:
+        previous = _current_trace.get()
+        _current_trace.set(trace)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current_trace.set(previous)
+        yield item
+
+@contextmanager
+def span(name, **labels):
+    """Times the enclosed block as stage `name`."""
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        observe("stage_duration_seconds", duration, "Wall time spent per pipeline stage.", stage=name, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, started_at, duration, labels)
+
+# --- HTTP endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serves GET /metrics on `port` from a background thread. Returns the server.
+    Only local clients can connect unless `host` is set to a public interface (e.g. "0.0.0.0").
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,115 @@
+# segment_planner.py
+import numpy as np
+
+# Default thresholds, in seconds.
+MAX_MERGE_GAP_SECONDS = 0.6     # Same-speaker turns closer than this are merged.
+MIN_SEGMENT_SECONDS = 0.5       # Shorter fragments are absorbed by a neighbour or dropped.
+MAX_SEGMENT_SECONDS = 30.0      # Longer turns are split.
+SPLIT_SEARCH_SECONDS = 8.0      # A split point is searched for in the last seconds before the limit.
+ENERGY_FRAME_SECONDS = 0.025    # Frame length used to find low-energy split points.
+
+SHORT_ABSORB = "absorb"  # Attach a short fragment to a nearby segment of the same speaker, else keep it.
+SHORT_DROP = "drop"      # Discard short fragments.
+
+def _merge_same_speaker(turns, max_gap, max_duration):
+    merged = []
+    for start, end, speaker in sorted(turns):
+        if merged:
+            last_start, last_end, last_speaker = merged[-1]
+            if speaker == last_speaker and start - last_end <= max_gap and max(end, last_end) - last_start <= max_duration:
+                merged[-1] = (last_start, max(end, last_end), speaker)
+                continue
+        merged.append((start, end, speaker))
+    return merged
+
+def _handle_short(turns, min_duration, max_gap, policy, stats):
+    kept = [list(turn) for turn in turns if turn[1] - turn[0] >= min_duration]
+    if policy == SHORT_DROP:
+        stats["dropped"] += len(turns) - len(kept)
+        return [tuple(turn) for turn in kept]
+
+    starts = [turn[0] for turn in kept]
+    isolated = []
+    for start, end, speaker in turns:
+        if end - start >= min_duration:
+            continue
+        # Nearest kept segments before and after the fragment, if they are the same speaker's.
+        after = int(np.searchsorted(starts, start))
+        candidates = []
+        if after > 0 and kept[after - 1][2] == speaker:
+            candidates.append((start - kept[after - 1][1], after - 1))
+        if after < len(kept) and kept[after][2] == speaker:
+            candidates.append((kept[after][0] - end, after))
+        candidates = [(gap, index) for gap, index in candidates if gap <= max_gap]
+        if not candidates:
+            # Another speaker's words (e.g. a lone "yes") are kept as a segment of their own.
+            isolated.append((start, end, speaker))
+            continue
+        _, index = min(candidates)
+        kept[index][0] = min(kept[index][0], start)
+        kept[index][1] = max(kept[index][1], end)
+        stats["absorbed"] += 1
+    return sorted([tuple(turn) for turn in kept] + isolated)
+
+def find_split_point(samples, sample_rate, earliest, latest, frame_seconds=ENERGY_FRAME_SECONDS):
+    """
+    Returns the offset in seconds, between `earliest` and `latest`, of the quietest frame
+    (the last one if several are equally quiet, e.g. digital silence).
+    """
+    frame = max(1, int(frame_seconds * sample_rate))
+    first = int(earliest * sample_rate) // frame
+    last = min(int(latest * sample_rate), len(samples)) // frame
+    if last <= first:
+        return latest
+    region = samples[first * frame:last * frame].reshape(-1, frame)
+    energy = np.square(region, dtype=np.float64).mean(axis=1)
+    quietest = len(energy) - 1 - int(np.argmin(energy[::-1]))
+    return (first + quietest) * frame / sample_rate + frame_seconds / 2
+
+def _split_long(turns, get_samples, sample_rate, max_duration, search_seconds, stats):
+    planned = []
+    for start, end, speaker in turns:
+        if end - start <= max_duration:
+            planned.append((start, end, speaker))
+            continue
+        samples = get_samples(start, end)
+        offset = 0.0
+        duration = end - start
+        while duration - offset > max_duration:
+            latest = offset + max_duration
+            # Search strictly after the previous cut so every segment is at least a frame long;
+            # otherwise (e.g. max_duration <= search_seconds on silence) the cut could stay put.
+            earliest = max(offset + ENERGY_FRAME_SECONDS, latest - search_seconds)
+            cut = find_split_point(samples, sample_rate, earliest, latest)
+            if not offset + ENERGY_FRAME_SECONDS <= cut <= latest:
+                cut = latest
+            planned.append((start + offset, start + cut, speaker))
+            stats["split"] += 1
+            offset = cut
+        planned.append((start + offset, end, speaker))
+    return planned
+
+def plan_segments(turns, get_samples, sample_rate=16000, max_gap=MAX_MERGE_GAP_SECONDS,
+                  min_duration=MIN_SEGMENT_SECONDS, max_duration=MAX_SEGMENT_SECONDS,
+                  split_search_seconds=SPLIT_SEARCH_SECONDS, short_policy=SHORT_ABSORB):
+    """
+    Turns diarization output into the segments sent to the translation model.
+    `turns` is a list of (start, end, speaker) in seconds and `get_samples(start, end)`
+    returns the audio of a time range. Adjacent same-speaker turns separated by at most
+    `max_gap` are merged, and fragments shorter than `min_duration` are absorbed by a
+    same-speaker neighbour within `max_gap`. Other fragments are kept as they are, or dropped
+    with short_policy="drop". Segments longer than `max_duration` are split at the quietest
+    point of the last `split_search_seconds`.
+    Returns (planned turns, stats).
+    """
+    stats = {"input_turns": len(turns), "merged": 0, "absorbed": 0, "dropped": 0, "split": 0}
+    merged = _merge_same_speaker(turns, max_gap, max_duration)
+    stats["merged"] = len(turns) - len(merged)
+    kept = _handle_short(merged, min_duration, max_gap, short_policy, stats)
+    # Absorbing fragments can bring same-speaker segments close enough to merge.
+    remerged = _merge_same_speaker(kept, max_gap, max_duration)
+    stats["merged"] += len(kept) - len(remerged)
+    planned = _split_long(remerged, get_samples, sample_rate, max_duration, split_search_seconds, stats)
+    stats["planned_segments"] = len(planned)
+    stats["model_inputs_saved"] = len(turns) - len(planned)
+    return planned, stats
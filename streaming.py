@@ -0,0 +1,286 @@
+# streaming.py
+"""
+Live translation: audio arrives in small chunks, is cut into utterances by an energy-based
+voice-activity detector, and each utterance is translated with Canary and spoken with a
+Piper voice as soon as it ends.
+
+A WAV file can be fed through the same chunked interface at real-time speed:
+    python streaming.py talk.wav --source en --target fr --voice fr_FR-siwis-medium --output live.wav
+"""
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+
+from metrics import inc, span
+from segment_planner import find_split_point
+from timeline import assemble_timeline, read_wav, resample, to_float32, write_wav
+from utils import SAMPLE_RATE, synthesize_segments, translate_segments
+
+# Chunk length sent by the microphone (and by simulate_stream).
+STREAM_CHUNK_SECONDS = 0.5
+
+# Voice-activity detection works on short frames: a frame is speech when its level is
+# above SPEECH_THRESHOLD_DB (dBFS). An utterance ends after MIN_SILENCE_SECONDS of silence.
+VAD_FRAME_SECONDS = 0.03
+SPEECH_THRESHOLD_DB = -40.0
+MIN_SILENCE_SECONDS = 0.5
+PRE_ROLL_SECONDS = 0.2
+MIN_UTTERANCE_SECONDS = 0.3
+
+# Latency/accuracy trade-off: an utterance that is still going after MAX_UTTERANCE_SECONDS is
+# cut at its quietest point in the last SPLIT_SEARCH_SECONDS. Shorter utterances come back
+# sooner; longer ones give Canary more context.
+MAX_UTTERANCE_SECONDS = 8.0
+SPLIT_SEARCH_SECONDS = 2.0
+
+# A session that receives no audio for this long is closed and its worker thread exits, so
+# sessions abandoned without finish() (closed tab, dropped connection) do not pile up.
+STREAM_IDLE_TIMEOUT_SECONDS = 120.0
+
+def to_mono_float32(samples, sample_rate):
+    """Converts a (samples,) or (samples, channels) chunk to 16kHz mono float32."""
+    samples = np.asarray(samples)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1).astype(samples.dtype)
+    return resample(to_float32(samples), sample_rate, SAMPLE_RATE)
+
+class UtteranceSegmenter:
+    """
+    Cuts a stream of 16kHz float32 chunks into utterances. feed() returns the utterances
+    completed by a chunk as (start_seconds, samples), start_seconds counted from the first chunk.
+    """
+
+    def __init__(self, max_utterance_seconds=MAX_UTTERANCE_SECONDS, threshold_db=SPEECH_THRESHOLD_DB,
+                 min_silence_seconds=MIN_SILENCE_SECONDS, min_utterance_seconds=MIN_UTTERANCE_SECONDS):
+        self.frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+        self.max_frames = max(1, int(max_utterance_seconds / VAD_FRAME_SECONDS))
+        self.threshold_db = threshold_db
+        self.min_silence_frames = max(1, int(min_silence_seconds / VAD_FRAME_SECONDS))
+        self.min_speech_frames = max(1, int(min_utterance_seconds / VAD_FRAME_SECONDS))
+        self.pre_roll_frames = int(PRE_ROLL_SECONDS / VAD_FRAME_SECONDS)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._position = 0         # Index of the next frame.
+        self._frames = []          # Frames of the utterance in progress (with pre-roll).
+        self._start = 0            # Frame index where it starts.
+        self._speech_frames = 0
+        self._silence_frames = 0
+
+    def _emit(self, frame_count):
+        """Ends the utterance after its first `frame_count` frames; returns it if long enough."""
+        samples = np.concatenate(self._frames[:frame_count])
+        utterance = (self._start * self.frame / SAMPLE_RATE, samples)
+        speech_frames = self._speech_frames
+        self._frames = self._frames[frame_count:]
+        self._start += frame_count
+        self._speech_frames = 0
+        self._silence_frames = 0
+        return utterance if speech_frames >= self.min_speech_frames else None
+
+    def _cut_long(self):
+        """Splits an over-long utterance at its quietest frame and keeps the rest going."""
+        samples = np.concatenate(self._frames)
+        duration = len(samples) / SAMPLE_RATE
+        cut = find_split_point(samples, SAMPLE_RATE, max(0.0, duration - SPLIT_SEARCH_SECONDS), duration, VAD_FRAME_SECONDS)
+        frame_count = min(len(self._frames) - 1, max(1, int(cut / VAD_FRAME_SECONDS)))
+        # The remaining frames are still speech: count them towards the next utterance.
+        remaining = len(self._frames) - frame_count
+        utterance = self._emit(frame_count)
+        self._speech_frames = remaining
+        return utterance
+
+    def feed(self, samples):
+        samples = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        usable = len(samples) - len(samples) % self.frame
+        self._pending = samples[usable:]
+        utterances = []
+        for frame in samples[:usable].reshape(-1, self.frame):
+            level_db = 10 * np.log10(np.mean(np.square(frame, dtype=np.float64)) + 1e-12)
+            is_speech = level_db > self.threshold_db
+            self._position += 1
+
+            if not self._speech_frames:
+                # Between utterances: keep a little audio before the speech starts.
+                self._frames.append(frame)
+                if len(self._frames) > self.pre_roll_frames + 1:
+                    self._frames.pop(0)
+                self._start = self._position - len(self._frames)
+                if is_speech:
+                    self._speech_frames = 1
+                continue
+
+            self._frames.append(frame)
+            if is_speech:
+                self._speech_frames += 1
+                self._silence_frames = 0
+            else:
+                self._silence_frames += 1
+
+            utterance = None
+            if self._silence_frames >= self.min_silence_frames:
+                # Keep as much trailing silence as pre-roll, not the whole pause.
+                trailing = max(0, self._silence_frames - self.pre_roll_frames)
+                utterance = self._emit(len(self._frames) - trailing)
+                self._frames = []
+            elif len(self._frames) >= self.max_frames:
+                utterance = self._cut_long()
+            if utterance is not None:
+                utterances.append(utterance)
+        return utterances
+
+    def flush(self):
+        """Ends the stream; returns the utterance in progress, if any."""
+        if self._speech_frames and self._frames:
+            utterance = self._emit(len(self._frames))
+            self._frames = []
+            return [utterance] if utterance is not None else []
+        return []
+
+class StreamingTranslator:
+    """
+    A live translation session. feed() only runs the voice-activity detector; utterances are
+    translated and synthesized one at a time on a background thread, and results() returns
+    those that are ready. Each result is a dict with the utterance start, the translated text,
+    the synthesized (int16 samples, sample_rate) and the latency from the end of the utterance.
+    The session ends with finish(), close(), or after `idle_timeout` seconds without audio.
+    """
+
+    def __init__(self, source_lang, target_lang, voice_name, voices_dir="voices",
+                 max_utterance_seconds=MAX_UTTERANCE_SECONDS, threshold_db=SPEECH_THRESHOLD_DB,
+                 idle_timeout=STREAM_IDLE_TIMEOUT_SECONDS):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.voice_name = voice_name
+        self.voices_dir = voices_dir
+        self.segmenter = UtteranceSegmenter(max_utterance_seconds, threshold_db)
+        self.transcript = []
+        self.idle_timeout = idle_timeout
+        self.closed = False
+        self._last_activity = time.monotonic()
+        self._utterances = queue.Queue()
+        self._results = queue.Queue()
+        self._finished = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="streaming-translator", daemon=True)
+        self._worker.start()
+
+    def feed(self, samples, sample_rate):
+        if self.closed:
+            raise RuntimeError("The live translation session is closed.")
+        self._last_activity = time.monotonic()
+        for start, utterance in self.segmenter.feed(to_mono_float32(samples, sample_rate)):
+            self._utterances.put((start, utterance, time.perf_counter()))
+
+    def finish(self):
+        """Ends the input; the utterance in progress is translated too."""
+        for start, utterance in self.segmenter.flush():
+            self._utterances.put((start, utterance, time.perf_counter()))
+        self._utterances.put(None)
+
+    def close(self):
+        """Ends the session without translating what is still pending."""
+        self.closed = True
+        self._utterances.put(None)
+
+    def results(self, wait=False, timeout=None):
+        """Returns the results ready so far. With `wait`, blocks until every utterance is done."""
+        if wait:
+            self._finished.wait(timeout)
+        ready = []
+        while True:
+            try:
+                ready.append(self._results.get_nowait())
+            except queue.Empty:
+                return ready
+
+    def _run(self):
+        while not self.closed:
+            try:
+                item = self._utterances.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                if time.monotonic() - self._last_activity >= self.idle_timeout:
+                    print("Closing an idle live translation session.")
+                    break
+                continue
+            if item is None:
+                break
+            start, utterance, ended_at = item
+            try:
+                with span("streaming_utterance"):
+                    text = translate_segments([utterance], self.source_lang, self.target_lang)[0]
+                    samples, sample_rate = (None, None)
+                    if text.strip():
+                        (samples, sample_rate), = synthesize_segments([(self.voice_name, text)], self.voices_dir)
+            except Exception as e:
+                print(f"Live translation failed for the utterance at {start:.1f}s: {e}")
+                continue
+            inc("segments_total", 1, "Segments produced per stage.", stage="streaming")
+            result = {
+                "start": start,
+                "duration": len(utterance) / SAMPLE_RATE,
+                "translated_text": text,
+                "audio": samples,
+                "sample_rate": sample_rate,
+                "latency": time.perf_counter() - ended_at,
+            }
+            self.transcript.append(result)
+            self._results.put(result)
+        self.closed = True
+        self._finished.set()
+
+def simulate_stream(wav_path, translator, chunk_seconds=STREAM_CHUNK_SECONDS, realtime=True):
+    """
+    Feeds a WAV file to `translator` in chunks of `chunk_seconds`, paced like a microphone
+    when `realtime` is set, and yields each result as it becomes ready.
+    """
+    samples, sample_rate = read_wav(wav_path)
+    chunk = max(1, int(chunk_seconds * sample_rate))
+    started = time.perf_counter()
+    for offset in range(0, len(samples), chunk):
+        if realtime:
+            # The chunk is only "recorded" once its last sample has been played.
+            delay = started + (offset + chunk) / sample_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        translator.feed(samples[offset:offset + chunk], sample_rate)
+        yield from translator.results()
+    translator.finish()
+    yield from translator.results(wait=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a WAV file through the live streaming interface.")
+    parser.add_argument("input", help="16-bit PCM WAV file.")
+    parser.add_argument("--source", required=True)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--voice", required=True, help="Installed Piper voice.")
+    parser.add_argument("--voices-dir", default="voices")
+    parser.add_argument("--max-utterance", type=float, default=MAX_UTTERANCE_SECONDS,
+                        help="Longest utterance before a forced cut, in seconds (lower means less latency).")
+    parser.add_argument("--chunk", type=float, default=STREAM_CHUNK_SECONDS, help="Chunk length in seconds.")
+    parser.add_argument("--fast", action="store_true", help="Feed the file as fast as possible instead of in real time.")
+    parser.add_argument("--output", help="Write the translated utterances, placed at their source times, to this WAV.")
+    args = parser.parse_args()
+
+    translator = StreamingTranslator(args.source, args.target, args.voice, args.voices_dir, args.max_utterance)
+    results = []
+    for result in simulate_stream(args.input, translator, args.chunk, realtime=not args.fast):
+        results.append(result)
+        print(f"[{result['start']:7.2f}s] (+{result['latency']:.2f}s) {result['translated_text']}")
+
+    latencies = [result["latency"] for result in results]
+    if latencies:
+        print(f"\n{len(results)} utterance(s), latency after end of speech: "
+              f"median {np.median(latencies):.2f}s, max {max(latencies):.2f}s")
+    if args.output:
+        spoken = [result for result in results if result["audio"] is not None]
+        output_rate = max((result["sample_rate"] for result in spoken), default=22050)
+        clips = [
+            (result["start"], result["audio"] if result["sample_rate"] == output_rate
+             else resample(to_float32(result["audio"]), result["sample_rate"], output_rate))
+            for result in spoken
+        ]
+        write_wav(args.output, assemble_timeline(clips, output_rate), output_rate)
+        print(f"Translated audio written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# stub_models.py
+"""
+Lightweight stand-ins for torch, NeMo (Canary), pyannote, Piper and gradio.
+
+They implement only the interfaces utils.py relies on, so the pipeline and the
+benchmarks can run on a CPU-only machine without the real packages or network access.
+Call install_stub_modules() before utils imports anything heavy.
+"""
+import sys
+import time
+import importlib.abc
+import importlib.util
+from types import SimpleNamespace
+import numpy as np
+
+# --- Model stand-ins ---
+class StubCanaryModel:
+    """Canary stand-in. Records the size of every transcribe() batch."""
+
+    def __init__(self, seconds_per_call=0.0, seconds_per_audio_second=0.0):
+        self.seconds_per_call = seconds_per_call
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.batch_sizes = []
+        self.segments = 0
+
+    def to(self, device):
+        return self
+
+    def transcribe(self, audio, batch_size=4, source_lang=None, target_lang=None, verbose=True, **kwargs):
+        self.batch_sizes.append(len(audio))
+        audio_seconds = sum(len(samples) for samples in audio) / 16000
+        time.sleep(self.seconds_per_call + audio_seconds * self.seconds_per_audio_second)
+        hypotheses = []
+        for samples in audio:
+            self.segments += 1
+            hypotheses.append(SimpleNamespace(
+                text=f"[{source_lang}->{target_lang}] segment {self.segments}, {len(samples) / 16000:.2f}s of speech"
+            ))
+        return hypotheses
+
+class StubTurn:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+class StubAnnotation:
+    """Mimics the part of pyannote.core.Annotation used by the pipeline."""
+
+    def __init__(self, tracks):
+        self.tracks = tracks  # list of (start, end, speaker)
+
+    def labels(self):
+        return sorted({speaker for _, _, speaker in self.tracks})
+
+    def itertracks(self, yield_label=False):
+        for i, (start, end, speaker) in enumerate(self.tracks):
+            if yield_label:
+                yield StubTurn(start, end), i, speaker
+            else:
+                yield StubTurn(start, end), i
+
+class StubDiarizationPipeline:
+    """
+    pyannote stand-in. Splits the waveform on silences (frame energy) and gives the
+    resulting turns to the speakers in turn.
+    """
+
+    def __init__(self, frame_seconds=0.05, threshold=1e-4, min_silence_seconds=0.3, seconds_per_audio_second=0.0):
+        self.frame_seconds = frame_seconds
+        self.threshold = threshold
+        self.min_silence_seconds = min_silence_seconds
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.calls = 0
+
+    def to(self, device):
+        return self
+
+    def __call__(self, file, num_speakers=None, min_speakers=None, max_speakers=None, return_embeddings=False,
+                 **kwargs):
+        self.calls += 1
+        waveform = np.asarray(file["waveform"], dtype=np.float32).reshape(-1)
+        sample_rate = file["sample_rate"]
+        time.sleep(len(waveform) / sample_rate * self.seconds_per_audio_second)
+        speakers = num_speakers or max_speakers or 2
+
+        frame = max(1, int(self.frame_seconds * sample_rate))
+        frame_count = len(waveform) // frame
+        energy = np.square(waveform[:frame_count * frame]).reshape(frame_count, frame).mean(axis=1)
+        voiced = energy > self.threshold
+
+        tracks = []
+        start = None
+        silent_frames = 0
+        max_silent_frames = int(self.min_silence_seconds / self.frame_seconds)
+        for i, is_voiced in enumerate(voiced):
+            if is_voiced:
+                if start is None:
+                    start = i
+                silent_frames = 0
+            elif start is not None:
+                silent_frames += 1
+                if silent_frames > max_silent_frames:
+                    tracks.append((start, i - silent_frames + 1))
+                    start = None
+        if start is not None:
+            tracks.append((start, frame_count))
+
+        annotation = StubAnnotation([
+            (begin * frame / sample_rate, end * frame / sample_rate, f"SPEAKER_{i % speakers:02d}")
+            for i, (begin, end) in enumerate(tracks)
+        ])
+        if not return_embeddings:
+            return annotation
+        # One-hot embeddings: the same label gets the same embedding in every window.
+        embeddings = np.eye(speakers)[[int(label.split("_")[1]) for label in annotation.labels()]]
+        return annotation, embeddings
+
+class StubPiperVoice:
+    """Piper stand-in. Synthesizes a tone whose length is proportional to the text."""
+
+    sample_rate = 22050
+    seconds_per_character = 0.06
+    seconds_per_call = 0.0
+    loads = 0
+    calls_total = 0
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.calls = 0
+
+    @classmethod
+    def load(cls, model_path, config_path=None, use_cuda=False, **kwargs):
+        cls.loads += 1
+        return cls(model_path)
+
+    def synthesize_wav(self, text, wav_file, *args, **kwargs):
+        self.calls += 1
+        type(self).calls_total += 1
+        time.sleep(self.seconds_per_call)
+        length = max(1, int(len(text) * self.seconds_per_character * self.sample_rate))
+        tone = np.sin(np.arange(length) * (2 * np.pi * 220 / self.sample_rate)) * 8000
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(self.sample_rate)
+        wav_file.writeframes(tone.astype(np.int16).tobytes())
+
+# --- torch stand-in ---
+class StubDevice:
+    def __init__(self, type_name):
+        self.type = str(type_name).split(":")[0]
+
+    def __str__(self):
+        return self.type
+
+class StubTensor:
+    """Wraps a NumPy array; only what utils.py does with tensors is supported."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def unsqueeze(self, dim):
+        return StubTensor(np.expand_dims(self.array, dim))
+
+    def numpy(self):
+        return self.array
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+# --- Module installation ---
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self, builders, import_delay):
+        self.builders = builders
+        self.import_delay = import_delay
+        self.imported = []
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname in self.builders:
+            return importlib.util.spec_from_loader(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        if "." not in module.__name__:
+            # Simulates the cost of importing a heavy top-level package.
+            time.sleep(self.import_delay)
+        self.builders[module.__name__](module)
+        self.imported.append(module.__name__)
+
+_finder = None
+
+def install_stub_modules(canary_model=None, diarization_pipeline=None, voice_class=StubPiperVoice,
+                         import_delay=0.0, load_delay=0.0):
+    """
+    Makes `import torch`, `nemo...`, `pyannote.audio`, `piper` and `gradio` resolve to stubs.
+    `import_delay` is slept on each top-level import and `load_delay` on each
+    from_pretrained() call, to emulate the real start-up costs.
+    Returns the list that records which stub modules have been imported.
+    """
+    global _finder
+    uninstall_stub_modules()
+    canary_model = canary_model or StubCanaryModel()
+    diarization_pipeline = diarization_pipeline or StubDiarizationPipeline()
+
+    def build_torch(module):
+        module.device = StubDevice
+        module.cuda = SimpleNamespace(is_available=lambda: False)
+        module.from_numpy = StubTensor
+        module.set_num_threads = lambda count: None
+        module.set_num_interop_threads = lambda count: None
+        module.get_num_threads = lambda: 1
+
+    def build_asr_models(module):
+        def from_pretrained(model_name=None, **kwargs):
+            time.sleep(load_delay)
+            return canary_model
+        module.ASRModel = SimpleNamespace(from_pretrained=from_pretrained)
+
+    def build_pyannote_audio(module):
+        def from_pretrained(name, **kwargs):
+            time.sleep(load_delay)
+            return diarization_pipeline
+        module.Pipeline = SimpleNamespace(from_pretrained=from_pretrained)
+
+    def build_piper(module):
+        module.PiperVoice = voice_class
+
+    def build_gradio(module):
+        module.Error = type("Error", (Exception,), {})
+
+    def build_empty(module):
+        pass
+
+    builders = {
+        "torch": build_torch,
+        "nemo": build_empty,
+        "nemo.collections": build_empty,
+        "nemo.collections.asr": build_empty,
+        "nemo.collections.asr.models": build_asr_models,
+        "pyannote": build_empty,
+        "pyannote.audio": build_pyannote_audio,
+        "piper": build_piper,
+        "gradio": build_gradio,
+    }
+    for name in builders:
+        sys.modules.pop(name, None)
+    _finder = _StubFinder(builders, import_delay)
+    sys.meta_path.insert(0, _finder)
+    return _finder.imported
+
+def uninstall_stub_modules():
+    """Removes the stubs installed by install_stub_modules()."""
+    global _finder
+    if _finder is None:
+        return
+    sys.meta_path.remove(_finder)
+    for name in _finder.builders:
+        sys.modules.pop(name, None)
+    _finder = None
@@ -0,0 +1,24 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# The modules live at the top level of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def utils(monkeypatch):
+    """utils imported with the stub models installed."""
+    from stub_models import install_stub_modules, uninstall_stub_modules
+    install_stub_modules()
+    sys.modules.pop("utils", None)
+    import utils
+    import benchmark
+    # Decode with the wave module so the test does not need FFmpeg.
+    monkeypatch.setattr(utils, "load_audio", benchmark._wave_load_audio)
+    monkeypatch.setattr(utils, "stream_audio", benchmark._wave_stream_audio)
+    monkeypatch.setattr(utils, "get_audio_duration", lambda path: None)
+    yield utils
+    uninstall_stub_modules()
+    sys.modules.pop("utils", None)
@@ -0,0 +1,125 @@
+# tests/test_downloader.py
+import os
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloader
+
+VOICE = "fr_FR-test-medium"
+FOLDER = "fr/fr_FR/test/medium"
+MODEL = bytes(range(256)) * 4000
+CONFIG = json.dumps({"audio": {"sample_rate": 22050, "quality": "medium"}}).encode()
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    """A voices mirror that honours Range requests like Hugging Face does."""
+
+    files = {}
+    requests = []
+    truncate_after = None  # Close the connection after this many body bytes.
+
+    def do_GET(self):
+        path = self.path.lstrip("/")
+        range_header = self.headers.get("Range")
+        self.requests.append((path, range_header))
+        data = self.files.get(path)
+        if data is None:
+            self.send_error(404)
+            return
+        if range_header:
+            offset = int(range_header.split("=")[1].rstrip("-"))
+            if offset >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}")
+            data = data[offset:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.truncate_after is not None:
+            data = data[:self.truncate_after]
+            self.close_connection = True
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    files = {f"{FOLDER}/{VOICE}.onnx": MODEL, f"{FOLDER}/{VOICE}.onnx.json": CONFIG}
+    manifest = {VOICE: {"files": {
+        path: {"size_bytes": len(data), "md5_digest": hashlib.md5(data).hexdigest()} for path, data in files.items()
+    }}}
+    MirrorHandler.files = {**files, "voices.json": json.dumps(manifest).encode()}
+    MirrorHandler.requests = []
+    MirrorHandler.truncate_after = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    voices_dir = tmp_path / "voices"
+    monkeypatch.setattr(downloader, "VOICES_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(downloader, "VOICES_DIR", str(voices_dir))
+    monkeypatch.setattr(downloader, "_manifest", None)
+    yield voices_dir
+    server.shutdown()
+
+def model_requests():
+    return [range_header for path, range_header in MirrorHandler.requests if path.endswith(".onnx")]
+
+def test_download(mirror):
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
+    assert (mirror / f"{VOICE}.onnx.json").read_bytes() == CONFIG
+    assert not (mirror / f"{VOICE}.onnx.part").exists()
+
+def test_resume_partial_download(mirror):
+    os.makedirs(mirror)
+    (mirror / f"{VOICE}.onnx.part").write_bytes(MODEL[:300000])
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
+    assert model_requests() == ["bytes=300000-"]
+
+def test_complete_part_file_is_installed_without_request(mirror):
+    os.makedirs(mirror)
+    (mirror / f"{VOICE}.onnx.part").write_bytes(MODEL)
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
+    assert model_requests() == []
+
+def test_complete_part_file_without_manifest(mirror):
+    # Without sizes from the manifest the server answers the resume with 416.
+    del MirrorHandler.files["voices.json"]
+    os.makedirs(mirror)
+    (mirror / f"{VOICE}.onnx.part").write_bytes(MODEL)
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
+    assert model_requests() == [f"bytes={len(MODEL)}-"]
+
+def test_dropped_connection_without_manifest_is_resumed(mirror):
+    del MirrorHandler.files["voices.json"]
+    MirrorHandler.truncate_after = 1000
+    assert not downloader.download_voice_if_needed(VOICE)
+    assert not (mirror / f"{VOICE}.onnx").exists()
+    assert not (mirror / f"{VOICE}.onnx.json").exists()
+    assert (mirror / f"{VOICE}.onnx.part").read_bytes() == MODEL[:1000]
+
+    MirrorHandler.truncate_after = None
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
+    assert model_requests() == [None, "bytes=1000-"]
+
+def test_corrupt_part_file_is_discarded(mirror):
+    os.makedirs(mirror)
+    (mirror / f"{VOICE}.onnx.part").write_bytes(b"x" * len(MODEL))
+    assert not downloader.download_voice_if_needed(VOICE)
+    assert not (mirror / f"{VOICE}.onnx.part").exists()
+    # The next attempt downloads the file again from the start.
+    assert downloader.download_voice_if_needed(VOICE)
+    assert (mirror / f"{VOICE}.onnx").read_bytes() == MODEL
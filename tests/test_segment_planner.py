@@ -0,0 +1,45 @@
+# tests/test_segment_planner.py
+import numpy as np
+
+from segment_planner import SHORT_DROP, plan_segments
+
+def silence(start, end):
+    return np.zeros(int((end - start) * 16000), dtype=np.float32)
+
+def test_short_fragment_of_another_speaker_is_kept():
+    planned, stats = plan_segments([(0, 3, "A"), (3.1, 3.4, "B"), (5, 8, "C")], silence)
+    assert planned == [(0, 3, "A"), (3.1, 3.4, "B"), (5, 8, "C")]
+    assert stats["absorbed"] == 0 and stats["dropped"] == 0
+
+def test_short_fragment_joins_same_speaker():
+    planned, _ = plan_segments([(0, 3, "A"), (3.1, 3.4, "A"), (5, 8, "C")], silence)
+    assert planned == [(0, 3.4, "A"), (5, 8, "C")]
+
+def test_isolated_short_turns_are_kept_by_default():
+    planned, _ = plan_segments([(1, 1.3, "A"), (4, 4.2, "B")], silence)
+    assert planned == [(1, 1.3, "A"), (4, 4.2, "B")]
+
+def test_drop_policy_is_opt_in():
+    planned, stats = plan_segments([(0, 3, "A"), (3.1, 3.4, "B"), (5, 8, "C")], silence, short_policy=SHORT_DROP)
+    assert planned == [(0, 3, "A"), (5, 8, "C")]
+    assert stats["dropped"] == 1
+
+def test_split_terminates_when_limit_is_within_search_window():
+    planned, stats = plan_segments([(0, 20, "A")], silence, max_duration=5)
+    assert planned[0][0] == 0 and planned[-1][1] == 20
+    assert all(a[1] == b[0] for a, b in zip(planned, planned[1:]))
+    assert all(0.025 <= end - start <= 5 for start, end, _ in planned)
+    assert stats["split"] == len(planned) - 1 <= 5
+
+def test_plan_options_reach_the_planner(utils, monkeypatch):
+    planner_calls = []
+    def recording_planner(turns, get_samples, sample_rate, **options):
+        planner_calls.append(options)
+        return plan_segments(turns, get_samples, sample_rate, **options)
+    monkeypatch.setattr(utils, "plan_segments", recording_planner)
+    monkeypatch.setattr(utils, "diarize_file", lambda *args: iter([([(0, 20, "A")], silence(0, 20), 0.0)]))
+    segments = utils.process_diarization_and_translation(
+        "talk.wav", 2, "en", "fr", use_cache=False, long_audio=False, plan_options={"max_duration": 5}
+    )
+    assert planner_calls == [{"max_duration": 5}]
+    assert len(segments) > 1 and all(s["end"] - s["start"] <= 5 for s in segments)
@@ -0,0 +1,35 @@
+# tests/test_synthesis.py
+import time
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+class EspeakVoice:
+    """A voice that phonemizes through a process-wide "current voice", like espeak-ng."""
+
+    current = None
+
+    def __init__(self, espeak_voice):
+        self.espeak_voice = espeak_voice
+
+    @classmethod
+    def load(cls, model_path, use_cuda=False, **kwargs):
+        return cls("en-gb" if "en_GB" in model_path else "en-us")
+
+    def phonemize(self, text):
+        EspeakVoice.current = self.espeak_voice
+        time.sleep(0.001)
+        return [[EspeakVoice.current, text]]
+
+    def synthesize(self, text):
+        return self.phonemize(text)
+
+def test_concurrent_voices_phonemize_with_their_own_espeak_voice(utils, monkeypatch):
+    monkeypatch.setattr(importlib.import_module("piper"), "PiperVoice", EspeakVoice)
+    voices = [
+        utils._load_piper_model("voices/en_US-lessac-medium.onnx"),
+        utils._load_piper_model("voices/en_GB-alba-medium.onnx"),
+    ]
+    jobs = [(voices[i % 2], f"sentence {i}") for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda job: job[0].synthesize(job[1]), jobs))
+    assert [result[0][0] for result in results] == [voice.espeak_voice for voice, _ in jobs]
@@ -0,0 +1,59 @@
+# tests/test_windowed_diarization.py
+import wave
+
+import numpy as np
+import pytest
+
+from stub_models import StubDiarizationPipeline
+
+SAMPLE_RATE = 16000
+
+def write_speech(path, duration, speech):
+    """Writes noise during each (start, end) of `speech` and silence elsewhere."""
+    rng = np.random.default_rng(0)
+    samples = np.zeros(int(duration * SAMPLE_RATE), dtype=np.int16)
+    for start, end in speech:
+        first, last = int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)
+        samples[first:last] = (rng.standard_normal(last - first) * 3000).astype(np.int16)
+    with wave.open(path, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(SAMPLE_RATE)
+        writer.writeframes(samples.tobytes())
+
+def speech_seconds(turns):
+    """Total duration covered by at least one turn."""
+    total, covered_until = 0.0, float("-inf")
+    for start, end, _ in sorted(turns):
+        if end > covered_until:
+            total += end - max(start, covered_until)
+            covered_until = end
+    return total
+
+def collect(groups):
+    turns = []
+    for group_turns, audio, audio_start in groups:
+        for start, end, _ in group_turns:
+            # Every turn must be inside the audio of its group.
+            assert audio_start - 1e-6 <= start and end <= audio_start + len(audio) / SAMPLE_RATE + 1e-6
+        turns.extend(group_turns)
+    return turns
+
+@pytest.mark.parametrize("speech", [
+    [(2, 10), (25, 41), (45, 50)],    # A turn across the first window boundary.
+    [(3, 9), (12, 70), (75, 78)],     # A turn longer than a window.
+    [(15, 17.5), (18, 19.8), (33, 37), (55, 59)],
+])
+def test_windowed_keeps_all_speech(tmp_path, utils, speech):
+    path = str(tmp_path / "speech.wav")
+    write_speech(path, 80, speech)
+    pipeline = StubDiarizationPipeline()
+
+    single = collect(utils.diarize_file(path, 2, pipeline))
+    windowed = collect(utils.diarize_file_windowed(path, 2, pipeline, window_seconds=20, overlap_seconds=4))
+
+    expected = sum(end - start for start, end in speech)
+    assert speech_seconds(single) == pytest.approx(expected, abs=0.3)
+    assert speech_seconds(windowed) == pytest.approx(speech_seconds(single), abs=0.3)
+    # Windows do not translate the same speech twice.
+    assert sum(end - start for start, end, _ in windowed) == pytest.approx(speech_seconds(windowed), abs=0.3)
@@ -0,0 +1,95 @@
+# timeline.py
+import wave
+import numpy as np
+
+# What to do when a synthesized segment is still playing when the next one should start.
+OVERLAP_PUSH = "push"  # Delay the next segment until the previous one has finished.
+OVERLAP_MIX = "mix"    # Start the next segment on time and mix both signals.
+OVERLAP_POLICIES = (OVERLAP_PUSH, OVERLAP_MIX)
+
+def resample(samples, source_rate, target_rate):
+    """Linear-interpolation resampling of a mono signal. Returns float32."""
+    samples = np.asarray(samples, dtype=np.float32)
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(target_length, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def to_float32(samples):
+    """Converts int16 PCM to float32 in [-1, 1]; float input is returned as float32."""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
+
+def to_int16(samples):
+    """Converts a float32 signal in [-1, 1] to int16 PCM, clipping anything outside."""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples
+    return np.rint(np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+def layout_timeline(starts, lengths, sample_rate, overlap=OVERLAP_PUSH):
+    """
+    Computes where each clip lands on the output timeline.
+    `starts` are the requested start times in seconds and `lengths` the clip
+    lengths in samples. Returns (offsets in samples, total length in samples).
+    """
+    if overlap not in OVERLAP_POLICIES:
+        raise ValueError(f"Unknown overlap policy '{overlap}'. Expected one of {OVERLAP_POLICIES}.")
+
+    offsets = []
+    cursor = 0
+    total_length = 0
+    for start, length in zip(starts, lengths):
+        offset = max(int(round(start * sample_rate)), 0)
+        if overlap == OVERLAP_PUSH:
+            offset = max(offset, cursor)
+        offsets.append(offset)
+        cursor = offset + length
+        total_length = max(total_length, cursor)
+    return offsets, total_length
+
+def assemble_timeline(clips, sample_rate, overlap=OVERLAP_PUSH):
+    """
+    Places clips on a single preallocated timeline.
+    `clips` is a list of (start_seconds, samples) in timeline order, all at `sample_rate`.
+    With the "push" policy clips never overlap and are copied as int16; with "mix"
+    overlapping clips are summed in float32 and clipped back to int16.
+    Each clip is written once, so the cost grows linearly with the number of clips.
+    """
+    starts = [start for start, _ in clips]
+    lengths = [len(samples) for _, samples in clips]
+    offsets, total_length = layout_timeline(starts, lengths, sample_rate, overlap)
+
+    if overlap == OVERLAP_PUSH:
+        timeline = np.zeros(total_length, dtype=np.int16)
+        for offset, (_, samples) in zip(offsets, clips):
+            timeline[offset:offset + len(samples)] = to_int16(samples)
+        return timeline
+
+    timeline = np.zeros(total_length, dtype=np.float32)
+    for offset, (_, samples) in zip(offsets, clips):
+        timeline[offset:offset + len(samples)] += to_float32(samples)
+    return to_int16(timeline)
+
+def read_wav(wav_file):
+    """Reads a 16-bit PCM WAV (path or file object) into (int16 mono samples, sample_rate)."""
+    with wave.open(wav_file, "rb") as reader:
+        sample_rate = reader.getframerate()
+        channels = reader.getnchannels()
+        if reader.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported.")
+        samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+def write_wav(path, samples, sample_rate):
+    """Writes mono int16 samples to a WAV file."""
+    with wave.open(path, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(to_int16(samples).tobytes())
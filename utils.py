@@ -1,146 +1,924 @@
 # utils.py (Final corrected version)
+import io
 import os
+import json
 import wave
-import torch
-import gradio as gr
-from pydub import AudioSegment
-from piper import PiperVoice
-from pyannote.audio import Pipeline
-from nemo.collections.asr.models import ASRModel
+import threading
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cache import SynthesisCache, TranslationCache, segment_key, voice_file_version
+from voice_cache import VoiceCache
+from voice_registry import get_registry
+from jobs import STAGE_LIMITS, scheduler
+from metrics import current_trace, inc, register_collector, span, use_trace
+from segment_planner import plan_segments
+from timeline import (
+    OVERLAP_PUSH, assemble_timeline, read_wav, resample, to_float32, write_wav
+)
 
-# --- Configuration and loading of "lightweight" models ---
-print("Loading Canary-1b-v2 model, please wait...")
+# --- Configuration ---
+# torch, nemo, pyannote, piper and gradio are imported on first use only, so that the UI
+# and lightweight helpers such as get_supported_languages() are available immediately.
+CANARY_MODEL_NAME = "nvidia/canary-1b-v2"
+DIARIZATION_MODEL_NAME = "ivrit-ai/pyannote-speaker-diarization-3.1"
 
-# MODIFIED HERE: We create a torch.device object, not just a string.
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {DEVICE}")
+# Canary works on 16kHz mono audio.
+SAMPLE_RATE = 16000
 
-canary_model = ASRModel.from_pretrained(model_name="nvidia/canary-1b-v2").to(DEVICE)
+# Segments are sent to Canary in batches. A batch is closed as soon as it holds
+# CANARY_BATCH_SIZE segments or CANARY_BATCH_SECONDS of audio, whichever comes first.
+CANARY_BATCH_SIZE = 16
+CANARY_BATCH_SECONDS = 240.0
 
-# Initialize the pipeline to None. It will be loaded on the first call.
+# Long-audio mode: files longer than LONG_AUDIO_THRESHOLD_SECONDS are decoded as a stream and
+# diarized in overlapping windows, so memory use does not grow with the duration of the file.
+# Speakers are matched across windows by comparing their embeddings (cosine similarity).
+LONG_AUDIO_THRESHOLD_SECONDS = 1800
+DIARIZATION_WINDOW_SECONDS = 600
+DIARIZATION_WINDOW_OVERLAP_SECONDS = 30
+SPEAKER_LINK_THRESHOLD = 0.5
+# A turn ending this close to the end of a window is treated as cut off by the window.
+WINDOW_EDGE_SECONDS = 0.5
+
+# Number of Piper workers used by synthesize_and_combine. Each worker holds its own copy
+# of every voice it uses. None picks automatically: sequential on a GPU, where the sessions
+# would compete for the same device, and up to 4 workers on a CPU.
+SYNTHESIS_WORKERS = None
+
+# Canary outputs are cached on disk, keyed by the segment's samples, the language pair and
+# the model, so re-running step 1 on the same recording does not re-translate it.
+# Set TRANSLATION_CACHE=off in the environment, or pass use_cache=False, to disable it.
+TRANSLATION_CACHE_ENABLED = os.environ.get("TRANSLATION_CACHE", "on").lower() not in ("0", "off", "false")
+TRANSLATION_CACHE_PATH = os.path.join("cache", "translations.sqlite3")
+TRANSLATION_CACHE_MAX_MB = 256
+
+# RAM budget for loaded Piper voices, estimated from the size of their .onnx files.
+VOICE_CACHE_MAX_MB = 1024
+
+# RAM budget for synthesized segments kept between runs of step 2, so changing the voice of
+# one speaker only re-synthesizes that speaker's segments.
+SYNTHESIS_CACHE_MAX_MB = 1024
+
+# Sample rate of the final audio when no segment could be synthesized (Piper's usual rate).
+DEFAULT_OUTPUT_RATE = 22050
+
+# Inference profiles, selected with INFERENCE_PROFILE. "default" uses the GPU when there is
+# one and full-precision models. "cpu" is tuned for machines without a GPU: Canary's Linear
+# layers (encoder and decoder) are quantized to int8 when it is loaded, and torch and the
+# ONNX Runtime sessions of Piper use explicit thread counts (CPU_THREADS, CPU_INTEROP_THREADS).
+# Piper sessions split CPU_THREADS between the synthesis jobs allowed to run at once
+# (see make_piper_session_options) and each job synthesizes on a single worker.
+INFERENCE_PROFILES = {
+    "default": {
+        "device": None,
+        "quantize_canary": False,
+        "intra_op_threads": None,
+        "inter_op_threads": None,
+        "piper_session_options": False,
+    },
+    "cpu": {
+        "device": "cpu",
+        "quantize_canary": True,
+        "intra_op_threads": int(os.environ.get("CPU_THREADS", os.cpu_count() or 1)),
+        "inter_op_threads": int(os.environ.get("CPU_INTEROP_THREADS", "1")),
+        "piper_session_options": True,
+    },
+}
+INFERENCE_PROFILE = os.environ.get("INFERENCE_PROFILE", "default")
+
+# --- Lazy Model Loading ---
+_device = None
+_device_lock = threading.Lock()
+canary_model = None
+_canary_lock = threading.Lock()
 diarization_pipeline = None
+_diarization_lock = threading.Lock()
+_model_status = {"canary": "not loaded", "diarization": "not loaded"}
+
+def user_error(message):
+    """Builds the exception shown to the user in the UI (a plain RuntimeError without gradio)."""
+    try:
+        import gradio as gr
+    except ImportError:
+        return RuntimeError(message)
+    return gr.Error(message)
+
+def get_inference_profile(name=None):
+    """Returns the settings of profile `name` (default: INFERENCE_PROFILE)."""
+    name = name or INFERENCE_PROFILE
+    if name not in INFERENCE_PROFILES:
+        raise ValueError(f"Unknown inference profile '{name}'. Expected one of {sorted(INFERENCE_PROFILES)}.")
+    return INFERENCE_PROFILES[name]
+
+def apply_thread_settings(profile):
+    """Sets torch's intra-op and inter-op thread counts from a profile (None keeps torch's default)."""
+    import torch
+    if profile["intra_op_threads"]:
+        torch.set_num_threads(profile["intra_op_threads"])
+    if profile["inter_op_threads"]:
+        try:
+            torch.set_num_interop_threads(profile["inter_op_threads"])
+        except RuntimeError:
+            # Can only be set before torch runs any parallel work.
+            print("Warning: torch inter-op threads were already initialized and are left unchanged.")
+
+def get_device():
+    global _device
+    if _device is None:
+        with _device_lock:
+            if _device is None:
+                import torch
+                profile = get_inference_profile()
+                apply_thread_settings(profile)
+                # MODIFIED HERE: We create a torch.device object, not just a string.
+                _device = torch.device(profile["device"] or ("cuda" if torch.cuda.is_available() else "cpu"))
+                print(f"Using device: {_device} (inference profile: {INFERENCE_PROFILE})")
+    return _device
+
+def quantize_canary(model):
+    """Quantizes the Linear layers of a CPU Canary model to int8 in place (dynamic quantization)."""
+    import torch
+    model.eval()
+    with span("quantize", model="canary"):
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def load_canary_model(profile=None):
+    """Loads a new Canary model with the settings of `profile` (default: the active profile)."""
+    profile = profile or get_inference_profile()
+    device = get_device()
+    with span("model_load", model="canary"):
+        from nemo.collections.asr.models import ASRModel
+        model = ASRModel.from_pretrained(model_name=CANARY_MODEL_NAME).to(device)
+    if profile["quantize_canary"]:
+        if device.type != "cpu":
+            print("Int8 quantization of Canary is only applied on the CPU; keeping the full-precision model.")
+        else:
+            model = quantize_canary(model)
+            print("Canary quantized to int8.")
+    return model
+
+def canary_model_id():
+    """Identifies the Canary variant in use, so cached translations of different variants are kept apart."""
+    profile = get_inference_profile()
+    quantized = profile["quantize_canary"] and (profile["device"] == "cpu" or get_device().type == "cpu")
+    return f"{CANARY_MODEL_NAME}:int8" if quantized else CANARY_MODEL_NAME
+
+def get_canary_model():
+    """Returns the Canary model, loading it on the first call. Safe to call from several threads."""
+    global canary_model
+    if canary_model is None:
+        with _canary_lock:
+            if canary_model is None:
+                _model_status["canary"] = "loading"
+                print("Loading Canary-1b-v2 model, please wait...")
+                try:
+                    canary_model = load_canary_model()
+                except Exception as e:
+                    _model_status["canary"] = f"failed: {e}"
+                    raise
+                _model_status["canary"] = "ready"
+    return canary_model
+
+def get_diarization_pipeline():
+    """Returns the pyannote pipeline, loading it on the first call. Safe to call from several threads."""
+    global diarization_pipeline
+    if diarization_pipeline is None:
+        with _diarization_lock:
+            if diarization_pipeline is None:
+                _model_status["diarization"] = "loading"
+                print("Loading diarization pipeline...")
+                try:
+                    with span("model_load", model="diarization"):
+                        from pyannote.audio import Pipeline
+                        diarization_pipeline = Pipeline.from_pretrained(DIARIZATION_MODEL_NAME).to(get_device())
+                    print("Pyannote model loaded successfully.")
+                except Exception as e:
+                    _model_status["diarization"] = f"failed: {e}"
+                    error_message = (
+                        f"Failed to load the Pyannote diarization model. "
+                        f"Check your internet connection and ensure you are authenticated with Hugging Face "
+                        f"(run this command in your terminal: 'huggingface-cli login'). Error: {e}"
+                    )
+                    print(error_message)
+                    raise user_error(error_message)
+                _model_status["diarization"] = "ready"
+    return diarization_pipeline
+
+def get_model_status():
+    """Returns the loading state of each model: "not loaded", "loading", "ready" or "failed: ..."."""
+    return dict(_model_status)
+
+def start_background_warmup():
+    """Loads Canary and the diarization pipeline concurrently in background threads."""
+    def warm(loader):
+        try:
+            loader()
+        except Exception as e:
+            print(f"Background warm-up failed: {e}")
+
+    # torch is imported here first so that both threads do not race to import it.
+    get_device()
+    threads = [
+        threading.Thread(target=warm, args=(loader,), name=f"warmup-{name}", daemon=True)
+        for name, loader in (("canary", get_canary_model), ("diarization", get_diarization_pipeline))
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
 
 # --- Utility Functions ---
 def get_supported_languages():
     return { "English": "en", "French": "fr", "German": "de", "Spanish": "es", "Italian": "it", "Portuguese": "pt", "Dutch": "nl", "Polish": "pl", "Russian": "ru", "Swedish": "sv", "Ukrainian": "uk", "Czech": "cs", "Danish": "da", "Finnish": "fi", "Greek": "el", "Hungarian": "hu", "Latvian": "lv", "Romanian": "ro", "Slovak": "sk", "Slovenian": "sl" }
 
 def get_piper_voices(voices_dir="voices"):
-    voices_by_lang = {}
-    if not os.path.exists(voices_dir): return voices_by_lang
-    for filename in os.listdir(voices_dir):
-        if filename.endswith(".onnx"):
-            lang_code = filename.split('-')[0][:2]
-            voice_name = os.path.splitext(filename)[0]
-            if lang_code not in voices_by_lang: voices_by_lang[lang_code] = []
-            voices_by_lang[lang_code].append(voice_name)
-    return voices_by_lang
+    """Installed voices grouped by language code, served from the voice registry's index."""
+    return get_registry(voices_dir).by_language()
 
-# --- Main Processing Logic ---
-def process_diarization_and_translation(audio_path, num_speakers, source_lang, target_lang):
-    global diarization_pipeline
+# --- Audio Decoding ---
+def load_audio(audio_path, sample_rate=SAMPLE_RATE):
+    """
+    Decodes any audio file with FFmpeg straight into a float32 mono NumPy buffer
+    at `sample_rate`, without going through an intermediate file.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-i", audio_path,
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-"
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise user_error("Cannot read the audio file: FFmpeg is not installed or not on the PATH.")
 
-    if diarization_pipeline is None:
-        print("Loading diarization pipeline (first call)...")
-        try:
-            diarization_pipeline = Pipeline.from_pretrained("ivrit-ai/pyannote-speaker-diarization-3.1").to(DEVICE)
-            print("Pyannote model loaded successfully.")
-        except Exception as e:
-            error_message = (
-                f"Failed to load the Pyannote diarization model. "
-                f"Check your internet connection and ensure you are authenticated with Hugging Face "
-                f"(run this command in your terminal: 'huggingface-cli login'). Error: {e}"
+    # Read into a writable buffer so that torch.from_numpy can share it without a copy.
+    with span("decode"):
+        buffer = bytearray()
+        for block in iter(lambda: process.stdout.read(1 << 20), b""):
+            buffer += block
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise user_error(f"Cannot read the audio file. Error: {stderr.decode(errors='replace').strip()}")
+    audio = np.frombuffer(buffer, dtype=np.float32)
+    inc("audio_seconds_total", len(audio) / sample_rate, "Seconds of input audio decoded.")
+    return audio
+
+def audio_slice(audio, start, end, sample_rate=SAMPLE_RATE):
+    """Returns the [start, end) seconds of a decoded buffer as a view (no copy)."""
+    return audio[int(start * sample_rate):int(end * sample_rate)]
+
+def get_audio_duration(audio_path):
+    """Returns the duration of a file in seconds according to ffprobe, or None if unknown."""
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        audio_path
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        return float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def stream_audio(audio_path, block_seconds, sample_rate=SAMPLE_RATE):
+    """
+    Decodes a file with FFmpeg and yields it as float32 mono blocks of `block_seconds`
+    (the last block may be shorter). Only one block is held in memory at a time.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-i", audio_path,
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-"
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise user_error("Cannot read the audio file: FFmpeg is not installed or not on the PATH.")
+
+    block_bytes = int(block_seconds * sample_rate) * 4
+    produced = False
+    try:
+        while True:
+            with span("decode"):
+                buffer = bytearray()
+                while len(buffer) < block_bytes:
+                    data = process.stdout.read(block_bytes - len(buffer))
+                    if not data:
+                        break
+                    buffer += data
+            if not buffer:
+                break
+            produced = True
+            # A truncated stream may end on a partial sample.
+            block = np.frombuffer(buffer[:len(buffer) - len(buffer) % 4], dtype=np.float32)
+            inc("audio_seconds_total", len(block) / sample_rate, "Seconds of input audio decoded.")
+            yield block
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        returncode = process.wait()
+    if returncode != 0 and not produced:
+        raise user_error(f"Cannot read the audio file. Error: {stderr.decode(errors='replace').strip()}")
+
+# --- Batched Translation ---
+def make_translation_batches(durations, max_batch_size=CANARY_BATCH_SIZE, max_batch_seconds=CANARY_BATCH_SECONDS,
+                             sort_by_length=True):
+    """
+    Groups segment indices into batches bounded by count and total duration.
+    By default segments are sorted longest first so that each batch holds segments
+    of similar length, which keeps padding inside the model low. With
+    sort_by_length=False batches are runs of consecutive segments instead.
+    """
+    order = list(range(len(durations)))
+    if sort_by_length:
+        order.sort(key=lambda i: durations[i], reverse=True)
+    batches = []
+    current, current_seconds = [], 0.0
+    for i in order:
+        if current and (len(current) >= max_batch_size or current_seconds + durations[i] > max_batch_seconds):
+            batches.append(current)
+            current, current_seconds = [], 0.0
+        current.append(i)
+        current_seconds += durations[i]
+    if current:
+        batches.append(current)
+    return batches
+
+def translate_segments(waveforms, source_lang, target_lang, model=None,
+                       max_batch_size=CANARY_BATCH_SIZE, max_batch_seconds=CANARY_BATCH_SECONDS):
+    """
+    Translates a list of 16kHz mono float32 waveforms with Canary, in batches.
+    Returns the translated texts in the same order as `waveforms`.
+    `model` defaults to the loaded Canary model; any object exposing the same
+    `transcribe` method (e.g. a stub that records batch sizes) can be used instead.
+    """
+    model = get_canary_model() if model is None else model
+    durations = [len(waveform) / SAMPLE_RATE for waveform in waveforms]
+    texts = [""] * len(waveforms)
+
+    for batch in make_translation_batches(durations, max_batch_size, max_batch_seconds):
+        with scheduler.stage("translation"), span("translation_batch"):
+            output = model.transcribe(
+                [waveforms[i] for i in batch],
+                batch_size=len(batch),
+                source_lang=source_lang,
+                target_lang=target_lang,
+                verbose=False
             )
-            print(error_message)
-            raise gr.Error(error_message)
+        inc("model_calls_total", 1, "Calls to the models.", model="canary")
+        for i, hypothesis in zip(batch, output or []):
+            texts[i] = hypothesis.text if hypothesis else ""
+
+    return texts
+
+_translation_cache = None
+
+def get_translation_cache():
+    """Returns the shared translation cache, or None when it is disabled."""
+    global _translation_cache
+    if not TRANSLATION_CACHE_ENABLED:
+        return None
+    if _translation_cache is None:
+        _translation_cache = TranslationCache(TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MAX_MB * 1024 * 1024)
+    return _translation_cache
+
+def translate_segments_cached(waveforms, source_lang, target_lang, cache=None, **kwargs):
+    """
+    Same as translate_segments, but looks every segment up in `cache` first and only
+    sends the misses to the model. Without a cache it is translate_segments.
+    """
+    if cache is None:
+        return translate_segments(waveforms, source_lang, target_lang, **kwargs)
+
+    model_id = canary_model_id()
+    keys = [segment_key(waveform, source_lang, target_lang, model_id) for waveform in waveforms]
+    cached = cache.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    if cached:
+        print(f"Translation cache: {len(waveforms) - len(missing)}/{len(waveforms)} segment(s) already translated.")
 
+    translated = translate_segments([waveforms[i] for i in missing], source_lang, target_lang, **kwargs)
+    cache.put_many({keys[i]: text for i, text in zip(missing, translated)})
+
+    texts = [cached.get(key) for key in keys]
+    for i, text in zip(missing, translated):
+        texts[i] = text
+    return texts
+
+# --- Diarization ---
+def _no_progress(fraction, desc=None):
+    pass
+
+def _diarize(pipeline, samples, **kwargs):
+    import torch
+    # Pyannote accepts an in-memory waveform of shape (channel, time); from_numpy shares the buffer.
+    waveform = torch.from_numpy(samples).unsqueeze(0)
+    with scheduler.stage("diarization"), span("diarization"):
+        return pipeline({"waveform": waveform, "sample_rate": SAMPLE_RATE}, **kwargs)
+
+def diarize_file(audio_path, num_speakers, pipeline, progress=_no_progress):
+    """
+    Decodes and diarizes a whole file in one pass. Yields a single
+    (turns, audio, audio_start) group, where turns are (start, end, speaker) in seconds
+    and audio is the decoded buffer, starting at `audio_start` seconds.
+    """
     print("Preprocessing audio (16kHz, mono)...")
-    try:
-        audio = AudioSegment.from_file(audio_path)
-    except Exception as e:
-        raise gr.Error(f"Cannot read the audio file. Make sure FFmpeg is installed. Error: {e}")
-        
-    audio = audio.set_frame_rate(16000).set_channels(1)
-    
-    temp_audio_for_pyannote = "temp_pyannote_input.wav"
-    audio.export(temp_audio_for_pyannote, format="wav")
+    progress(0.0, desc="Decoding audio...")
+    audio = load_audio(audio_path)
 
     print("Diarization in progress...")
-    diarization = diarization_pipeline(temp_audio_for_pyannote, num_speakers=num_speakers)
-    os.remove(temp_audio_for_pyannote)
+    progress(0.05, desc="Diarization in progress...")
+    diarization = _diarize(pipeline, audio, num_speakers=num_speakers)
+    progress(0.3, desc="Diarization done.")
+    turns = [(turn.start, turn.end, speaker) for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    yield turns, audio, 0.0
+
+class SpeakerLinker:
+    """
+    Maps the speaker labels of each diarization window to global labels by comparing
+    speaker embeddings with the running mean embedding of every global speaker.
+    At most `max_speakers` global speakers are created.
+    """
 
-    print("Translating segments...")
+    def __init__(self, max_speakers, threshold=SPEAKER_LINK_THRESHOLD):
+        self.max_speakers = max_speakers
+        self.threshold = threshold
+        self.centroids = []
+        self.counts = []
+
+    @staticmethod
+    def _normalize(vector):
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _add(self, embedding):
+        self.centroids.append(embedding)
+        self.counts.append(1)
+        return len(self.centroids) - 1
+
+    def _closest(self, embedding, candidates):
+        return max(candidates, key=lambda i: float(np.dot(embedding, self.centroids[i])))
+
+    def link(self, local_labels, embeddings):
+        """Returns {local_label: global_label} for one window."""
+        local_embeddings = {}
+        for label, embedding in zip(local_labels, embeddings):
+            embedding = np.asarray(embedding, dtype=np.float64)
+            # pyannote returns NaN embeddings for speakers without enough clean speech.
+            local_embeddings[label] = None if np.isnan(embedding).any() else self._normalize(embedding)
+        known = [i for i, centroid in enumerate(self.centroids) if centroid is not None]
+
+        # Pair local and global speakers one-to-one, most similar pairs first.
+        pairs = sorted(
+            (
+                (float(np.dot(embedding, self.centroids[i])), label, i)
+                for label, embedding in local_embeddings.items() if embedding is not None
+                for i in known
+            ),
+            reverse=True
+        )
+        mapping = {}
+        for similarity, label, i in pairs:
+            if similarity < self.threshold:
+                break
+            if label not in mapping and i not in mapping.values():
+                mapping[label] = i
+
+        added = set()
+        for label, embedding in local_embeddings.items():
+            if label in mapping:
+                continue
+            if len(self.centroids) < self.max_speakers:
+                mapping[label] = self._add(embedding)
+                added.add(label)
+            elif embedding is not None and known:
+                # No room for a new speaker: take the closest one, even if already used.
+                mapping[label] = self._closest(embedding, known)
+            else:
+                mapping[label] = max(range(len(self.counts)), key=lambda i: self.counts[i])
+
+        # Move every matched global speaker towards the new embedding (running mean).
+        for label, i in mapping.items():
+            embedding = local_embeddings[label]
+            if embedding is None or label in added:
+                continue
+            if self.centroids[i] is None:
+                self.centroids[i] = embedding
+            else:
+                self.counts[i] += 1
+                self.centroids[i] = self._normalize(self.centroids[i] + (embedding - self.centroids[i]) / self.counts[i])
+        return {label: f"SPEAKER_{i:02d}" for label, i in mapping.items()}
+
+def diarize_file_windowed(audio_path, num_speakers, pipeline, progress=_no_progress,
+                          window_seconds=DIARIZATION_WINDOW_SECONDS, overlap_seconds=DIARIZATION_WINDOW_OVERLAP_SECONDS):
+    """
+    Diarizes a long file in overlapping windows while it is being decoded. Yields one
+    (turns, audio, audio_start) group per window, in the format of diarize_file; only
+    the current window is kept in memory. Each window owns the turns that start in its half of the overlap with its
+    neighbours, and speaker labels are made consistent across windows with SpeakerLinker.
+    A turn still going at the end of a window is carried over and joined to its continuation
+    in the next window, whose group then also holds the audio of the carried part. A turn
+    longer than a window is cut at the ownership boundary instead, so memory stays bounded.
+    """
+    duration = get_audio_duration(audio_path)
+    linker = SpeakerLinker(num_speakers)
+    step_seconds = window_seconds - overlap_seconds
+    overlap_samples = int(overlap_seconds * SAMPLE_RATE)
+
+    blocks = stream_audio(audio_path, step_seconds)
+    block = next(blocks, None)
+    tail = np.zeros(0, dtype=np.float32)
+    position = 0.0  # Start time of the current block.
+    is_first = True
+    carried = []    # (start, end, speaker) of turns that reached the end of the previous window.
+    carried_audio = np.zeros(0, dtype=np.float32)  # Audio of the carried turns before this window.
+    carried_start = position
+    previous_window_end = position
+    while block is not None:
+        next_block = next(blocks, None)
+        is_last = next_block is None
+
+        window = np.concatenate([tail, block])
+        window_start = position - len(tail) / SAMPLE_RATE
+        window_end = window_start + len(window) / SAMPLE_RATE
+        owned_from = window_start if is_first else window_start + overlap_seconds / 2
+        owned_until = window_end if is_last else window_end - overlap_seconds / 2
+
+        print(f"Diarizing window {window_start:.0f}s - {window_end:.0f}s...")
+        if duration:
+            progress(min(window_start / duration, 1.0), desc=f"Diarizing {window_start:.0f}s - {window_end:.0f}s...")
+        diarization, embeddings = _diarize(pipeline, window, max_speakers=num_speakers, return_embeddings=True)
+        labels = linker.link(diarization.labels(), embeddings)
+        found = [
+            (window_start + turn.start, min(window_start + turn.end, window_end), labels[speaker])
+            for turn, _, speaker in diarization.itertracks(yield_label=True)
+        ]
+
+        # The group's audio starts at the earliest carried turn.
+        audio = np.concatenate([carried_audio, window]) if len(carried_audio) else window
+        audio_start = carried_start if len(carried_audio) else window_start
+
+        turns = []
+        continued = set()
+        for start, end, speaker in carried:
+            # The continuation is the same speaker's turn that started in the overlap.
+            continuations = [
+                i for i, (found_start, found_end, found_speaker) in enumerate(found)
+                if found_speaker == speaker and found_start < window_start + overlap_seconds and found_end > start
+            ]
+            if continuations:
+                i = max(continuations, key=lambda i: found[i][1])
+                continued.add(i)
+                turns.append((start, max(end, found[i][1]), speaker))
+            else:
+                turns.append((start, end, speaker))
+        for i, (start, end, speaker) in enumerate(found):
+            if i in continued:
+                continue
+            if owned_from <= start < owned_until:
+                turns.append((start, end, speaker))
+            elif start < owned_from and end > previous_window_end:
+                # Continues a turn of the previous window under another label: keep the new part.
+                turns.append((previous_window_end, end, speaker))
+
+        carried = []
+        if not is_last:
+            next_window_start = window_end - min(overlap_seconds, window_end - window_start)
+            kept = []
+            for start, end, speaker in turns:
+                if end < window_end - WINDOW_EDGE_SECONDS:
+                    kept.append((start, end, speaker))
+                elif start >= next_window_start - step_seconds:
+                    # Short enough to carry with its audio: the next window completes it.
+                    carried.append((start, end, speaker))
+                else:
+                    # Longer than a window: keep the part up to the boundary, the next window
+                    # continues it from there.
+                    kept.append((start, owned_until, speaker))
+                    carried.append((owned_until, end, speaker))
+            turns = kept
+            carried_start = min((start for start, _, _ in carried), default=next_window_start)
+            if carried_start < next_window_start:
+                first = int(round((carried_start - audio_start) * SAMPLE_RATE))
+                last = int(round((next_window_start - audio_start) * SAMPLE_RATE))
+                carried_audio = audio[first:last].copy()
+            else:
+                carried_audio = np.zeros(0, dtype=np.float32)
+        yield sorted(turns), audio, audio_start
+        previous_window_end = window_end
+
+        tail = window[-overlap_samples:] if overlap_samples else np.zeros(0, dtype=np.float32)
+        position += len(block) / SAMPLE_RATE
+        block = next_block
+        is_first = False
+
+# --- Main Processing Logic ---
+def iter_diarization_and_translation(audio_path, num_speakers, source_lang, target_lang, use_cache=True,
+                                     progress=None, long_audio=None, plan=True, plan_options=None):
+    """
+    Streaming version of process_diarization_and_translation. Segments are translated
+    in batches of consecutive turns, and each batch of segment dicts is yielded in
+    timeline order as soon as it is ready. `progress`, if given, is called as
+    progress(fraction, desc=...), which matches gr.Progress.
+    `long_audio` selects windowed diarization (see diarize_file_windowed); by default it
+    is used for files longer than LONG_AUDIO_THRESHOLD_SECONDS.
+    With `plan`, diarization turns go through segment_planner.plan_segments first;
+    `plan_options` are passed to it as keyword arguments (max_duration, min_duration, ...).
+    """
+    progress = progress or _no_progress
+
+    progress(0.0, desc="Loading diarization model...")
+    pipeline = get_diarization_pipeline()
+
+    if long_audio is None:
+        duration = get_audio_duration(audio_path)
+        long_audio = duration is not None and duration > LONG_AUDIO_THRESHOLD_SECONDS
+    if long_audio:
+        print("Long audio: diarizing in overlapping windows.")
+        # Translation progress is not reported separately; the windows drive the progress bar.
+        turn_groups = diarize_file_windowed(audio_path, num_speakers, pipeline, progress)
+        translation_progress = _no_progress
+    else:
+        turn_groups = diarize_file(audio_path, num_speakers, pipeline, progress)
+        translation_progress = progress
+
+    cache = get_translation_cache() if use_cache else None
+    plan_totals = {}
+    for turns, audio, audio_start in turn_groups:
+        def get_samples(start, end):
+            return audio_slice(audio, start - audio_start, end - audio_start)
+
+        if plan:
+            diarized_durations = [end - start for start, end, _ in turns]
+            with span("planning"):
+                turns, stats = plan_segments(turns, get_samples, SAMPLE_RATE, **(plan_options or {}))
+            stats["model_calls_before"] = len(make_translation_batches(diarized_durations, sort_by_length=False))
+            stats["model_calls_after"] = len(make_translation_batches([end - start for start, end, _ in turns], sort_by_length=False))
+            for name, value in stats.items():
+                plan_totals[name] = plan_totals.get(name, 0) + value
+
+        print(f"Translating {len(turns)} segments...")
+        durations = [end - start for start, end, _ in turns]
+        translated_count = 0
+        translation_progress(0.3, desc=f"Translating {len(turns)} segments...")
+        for batch in make_translation_batches(durations, sort_by_length=False):
+            waveforms = [get_samples(turns[i][0], turns[i][1]) for i in batch]
+            translated_texts = translate_segments_cached(waveforms, source_lang, target_lang, cache)
+
+            segments_data = []
+            for i, translated_text in zip(batch, translated_texts):
+                start, end, speaker = turns[i]
+                segments_data.append({
+                    "start": start,
+                    "end": end,
+                    "speaker": speaker,
+                    "translated_text": translated_text,
+                    "original_duration": end - start
+                })
+
+            translated_count += len(batch)
+            inc("segments_total", len(batch), "Segments produced per stage.", stage="translation")
+            translation_progress(0.3 + 0.7 * translated_count / len(turns), desc=f"Translated {translated_count}/{len(turns)} segments")
+            yield segments_data
+
+    if plan_totals:
+        print(
+            f"Segment planner: {plan_totals['input_turns']} turns -> {plan_totals['planned_segments']} segments "
+            f"({plan_totals['merged']} merged, {plan_totals['absorbed']} absorbed, {plan_totals['dropped']} dropped, "
+            f"{plan_totals['split']} split); Canary calls {plan_totals['model_calls_before']} -> "
+            f"{plan_totals['model_calls_after']}, {plan_totals['model_inputs_saved']} fewer model inputs."
+        )
+
+def process_diarization_and_translation(audio_path, num_speakers, source_lang, target_lang, use_cache=True,
+                                        long_audio=None, plan=True, plan_options=None):
+    """Diarizes and translates a whole file, returning the list of segment dicts."""
     segments_data = []
-    
-    temp_chunk_dir = "temp_chunks_for_canary"
-    os.makedirs(temp_chunk_dir, exist_ok=True)
-
-    for i, (turn, _, speaker) in enumerate(diarization.itertracks(yield_label=True)):
-        start_ms = int(turn.start * 1000)
-        end_ms = int(turn.end * 1000)
-        chunk = audio[start_ms:end_ms]
-
-        chunk_path = os.path.join(temp_chunk_dir, f"chunk_{i}.wav")
-        chunk.export(chunk_path, format="wav")
-
-        output = canary_model.transcribe([chunk_path], source_lang=source_lang, target_lang=target_lang)
-        translated_text = output[0].text if output and output[0] else ""
-
-        segments_data.append({
-            "start": turn.start,
-            "end": turn.end,
-            "speaker": speaker,
-            "translated_text": translated_text,
-            "original_duration": turn.end - turn.start
-        })
-
-    for file_name in os.listdir(temp_chunk_dir):
-        os.remove(os.path.join(temp_chunk_dir, file_name))
-    os.rmdir(temp_chunk_dir)
-    
+    for batch in iter_diarization_and_translation(
+        audio_path, num_speakers, source_lang, target_lang, use_cache, long_audio=long_audio, plan=plan, plan_options=plan_options
+    ):
+        segments_data.extend(batch)
     return segments_data
 
 # --- Synthesis Logic (MODIFIED) ---
-def synthesize_and_combine(segments_data, voice_mapping, voices_dir="voices"):
+def make_piper_session_options(profile):
+    """
+    ONNX Runtime session options for Piper voices with the thread counts of `profile`. The
+    intra-op threads are shared by the synthesis jobs that may run at the same time
+    (SYNTHESIS_CONCURRENCY), so that together they do not ask for more than the budget.
+    """
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    if profile["intra_op_threads"]:
+        options.intra_op_num_threads = max(1, profile["intra_op_threads"] // STAGE_LIMITS["synthesis"])
+    if profile["inter_op_threads"]:
+        options.inter_op_num_threads = profile["inter_op_threads"]
+    return options
+
+# espeak-ng keeps the selected voice in process-wide state, and Piper selects the voice and
+# phonemizes in separate calls, so two threads using voices with different espeak voices
+# could phonemize with the wrong one. Phonemization is serialized; the ONNX inference that
+# follows runs outside the lock.
+_phonemize_lock = threading.Lock()
+
+def _serialize_phonemization(voice):
+    """Makes `voice` phonemize under _phonemize_lock. Returns the voice."""
+    phonemize = getattr(voice, "phonemize", None)
+    if phonemize is None:
+        return voice
+
+    def locked_phonemize(text):
+        with _phonemize_lock:
+            return phonemize(text)
+
+    # PiperVoice.synthesize() phonemizes the whole text through self.phonemize() first.
+    voice.phonemize = locked_phonemize
+    return voice
+
+def _load_piper_model(model_path, profile=None):
+    from piper import PiperVoice
+    profile = profile or get_inference_profile()
+    use_cuda_flag = (get_device().type == "cuda")
+    with span("model_load", model="piper"):
+        if not profile["piper_session_options"] or use_cuda_flag:
+            return _serialize_phonemization(PiperVoice.load(model_path, use_cuda=use_cuda_flag))
+        # Same as PiperVoice.load, with our own session options.
+        import onnxruntime
+        from piper.config import PiperConfig
+        with open(f"{model_path}.json", encoding="utf-8") as config_file:
+            config = PiperConfig.from_dict(json.load(config_file))
+        session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=make_piper_session_options(profile), providers=["CPUExecutionProvider"]
+        )
+        return _serialize_phonemization(PiperVoice(session=session, config=config))
+
+# Loaded voices are shared across calls, so trying several voice assignments in a row
+# does not reload the ONNX models every time.
+voice_cache = VoiceCache(loader=_load_piper_model, max_bytes=VOICE_CACHE_MAX_MB * 1024 * 1024)
+
+def load_piper_voice(voice_name, voices_dir="voices", slot=0):
+    """Returns a Piper voice from the shared cache, or None if it is not installed."""
+    return voice_cache.get(voice_name, voices_dir, slot)
+
+def preload_voices_for_langs(lang_codes, voices_dir="voices"):
+    """Loads every installed voice of the given target languages into the voice cache."""
+    installed = get_piper_voices(voices_dir)
+    voice_names = [voice for lang_code in lang_codes for voice in installed.get(lang_code, [])]
+    loaded = voice_cache.preload(voice_names, voices_dir)
+    print(f"Preloaded {len(loaded)} Piper voice(s) for {', '.join(lang_codes)}.")
+    return loaded
+
+def get_voice_cache_stats():
+    return voice_cache.stats()
+
+# Voice cache slots currently in use. A slot is only ever used by one thread at a time, so
+# concurrent synthesis jobs never share a PiperVoice instance.
+_free_voice_slots = []
+_next_voice_slot = itertools.count()
+_voice_slots_lock = threading.Lock()
+
+def _lease_voice_slots(count):
+    with _voice_slots_lock:
+        slots = [_free_voice_slots.pop() if _free_voice_slots else next(_next_voice_slot) for _ in range(count)]
+    return slots
+
+def _release_voice_slots(slots):
+    with _voice_slots_lock:
+        _free_voice_slots.extend(slots)
+        # Lowest slots first, so that the copies loaded by earlier runs are reused.
+        _free_voice_slots.sort(reverse=True)
+
+synthesis_cache = SynthesisCache(max_bytes=SYNTHESIS_CACHE_MAX_MB * 1024 * 1024)
+
+def synthesize_segment(voice_model, text):
+    """Synthesizes `text` into an in-memory WAV and returns (int16 samples, sample_rate)."""
+    buffer = io.BytesIO()
+    with span("synthesis"), wave.open(buffer, "wb") as wav_file:
+        voice_model.synthesize_wav(text, wav_file)
+    inc("model_calls_total", 1, "Calls to the models.", model="piper")
+    buffer.seek(0)
+    return read_wav(buffer)
+
+def synthesize_segments(jobs, voices_dir="voices", num_workers=1):
+    """
+    Synthesizes a list of (voice_name, text) jobs and returns their
+    (samples, sample_rate) in the same order. With more than one worker the jobs
+    run on a thread pool (ONNX Runtime releases the GIL during inference) and each
+    worker uses its own cache slot, i.e. its own copy of the voices it is given.
+    """
+    slots = _lease_voice_slots(max(1, num_workers))
+    try:
+        if num_workers <= 1:
+            return [synthesize_segment(load_piper_voice(voice_name, voices_dir, slots[0]), text) for voice_name, text in jobs]
+
+        worker_state = threading.local()
+        free_slots = iter(slots)
+        trace = current_trace()
+
+        def assign_slot():
+            worker_state.slot = next(free_slots)
+            use_trace(trace)
+
+        def run(job):
+            voice_name, text = job
+            return synthesize_segment(load_piper_voice(voice_name, voices_dir, worker_state.slot), text)
+
+        with ThreadPoolExecutor(max_workers=num_workers, initializer=assign_slot) as executor:
+            # map() yields results in submission order, i.e. timeline order.
+            return list(executor.map(run, jobs))
+    finally:
+        _release_voice_slots(slots)
+
+def synthesize_and_combine(segments_data, voice_mapping, voices_dir="voices", overlap=OVERLAP_PUSH,
+                           num_workers=None, output_dir="output"):
+    """
+    Synthesizes every segment with the voice assigned to its speaker and places the
+    results on a single timeline. `overlap` decides what happens when a segment is
+    still playing when the next one starts: "push" delays the next one, "mix" overlays them.
+    `num_workers` defaults to SYNTHESIS_WORKERS; the output does not depend on it.
+    The result is written to `output_dir`, which should be private to the calling job.
+    """
     print("Synthesizing speech and combining audio...")
-    final_audio = AudioSegment.empty()
-    last_segment_end_time = 0.0
-
-    piper_voices = {}
-    for _, voice_name in voice_mapping.items():
-        if voice_name and voice_name not in piper_voices:
-            model_path = os.path.join(voices_dir, f"{voice_name}.onnx")
-            if os.path.exists(model_path):
-                # MODIFIED HERE: We check the type of the DEVICE object, not its string value.
-                use_cuda_flag = (DEVICE.type == "cuda")
-                piper_voices[voice_name] = PiperVoice.load(model_path, use_cuda=use_cuda_flag)
-
-    output_dir = "output"
-    os.makedirs(output_dir, exist_ok=True)
-    temp_synthesis_path = os.path.join(output_dir, "temp_synth.wav")
+    if num_workers is None:
+        num_workers = SYNTHESIS_WORKERS
+    if num_workers is None:
+        # With explicit session threads (the "cpu" profile) each session is already parallel.
+        single_worker = get_device().type == "cuda" or get_inference_profile()["piper_session_options"]
+        num_workers = 1 if single_worker else min(4, os.cpu_count() or 1)
 
-    for segment in segments_data:
-        speaker = segment["speaker"]
-        voice_name = voice_mapping.get(speaker)
-        voice_model = piper_voices.get(voice_name)
+    installed_voices = {
+        voice_name for voice_name in voice_mapping.values()
+        if voice_name and os.path.exists(os.path.join(voices_dir, f"{voice_name}.onnx"))
+    }
+    segments_to_synthesize = [
+        segment for segment in segments_data
+        if voice_mapping.get(segment["speaker"]) in installed_voices
+    ]
+    voice_versions = {voice_name: voice_file_version(voice_name, voices_dir) for voice_name in installed_voices}
+    cache_keys = [
+        (segment["translated_text"], voice_mapping[segment["speaker"]], os.path.abspath(voices_dir),
+         voice_versions[voice_mapping[segment["speaker"]]])
+        for segment in segments_to_synthesize
+    ]
 
-        if not voice_model:
-            continue
+    # Only segments whose text or voice changed since a previous run are synthesized again,
+    # and identical (text, voice) pairs within a run are synthesized once.
+    results = {key: synthesis_cache.get(key) for key in dict.fromkeys(cache_keys)}
+    missing = [key for key, result in results.items() if result is None]
+    print(f"Synthesizing {len(missing)} unique segment(s) out of {len(cache_keys)}; the rest are reused.")
+    jobs = [(voice_name, text) for text, voice_name, _, _ in missing]
+    with scheduler.stage("synthesis"):
+        synthesized_missing = synthesize_segments(jobs, voices_dir, num_workers)
+    for key, (samples, sample_rate) in zip(missing, synthesized_missing):
+        synthesis_cache.put(key, samples, sample_rate)
+        results[key] = (samples, sample_rate)
 
-        silence_duration = (segment["start"] - last_segment_end_time) * 1000
-        if silence_duration > 0:
-            final_audio += AudioSegment.silent(duration=silence_duration)
+    inc("segments_total", len(segments_to_synthesize), "Segments produced per stage.", stage="synthesis")
+    synthesized = [
+        (segment["start"], samples, sample_rate)
+        for segment, (samples, sample_rate) in zip(segments_to_synthesize, (results[key] for key in cache_keys))
+    ]
 
-        with wave.open(temp_synthesis_path, "wb") as wav_file:
-            voice_model.synthesize_wav(segment["translated_text"], wav_file)
-        
-        synthesized_chunk = AudioSegment.from_wav(temp_synthesis_path)
-        final_audio += synthesized_chunk
-        last_segment_end_time = segment["start"] + synthesized_chunk.duration_seconds
+    os.makedirs(output_dir, exist_ok=True)
 
+    # Voices may use different sample rates; everything is brought to the highest one.
+    output_rate = max((rate for _, _, rate in synthesized), default=DEFAULT_OUTPUT_RATE)
+    clips = [
+        (start, samples if rate == output_rate else resample(to_float32(samples), rate, output_rate))
+        for start, samples, rate in synthesized
+    ]
     final_output_path = os.path.join(output_dir, "translated_conversation.wav")
-    final_audio.export(final_output_path, format="wav")
-    
-    if os.path.exists(temp_synthesis_path):
-        os.remove(temp_synthesis_path)
+    with span("export"):
+        final_audio = assemble_timeline(clips, output_rate, overlap)
+        write_wav(final_output_path, final_audio, output_rate)
+    print(f"Voice cache: {get_voice_cache_stats()}")
+
+    return final_output_path
+
+# --- Metrics ---
+def _collect_metrics():
+    """Cache statistics and model states, read at every scrape of the metrics endpoint."""
+    caches = {"voice": voice_cache.stats(), "synthesis": synthesis_cache.stats()}
+    if _translation_cache is not None:
+        caches["translation"] = _translation_cache.stats()
+    hits = {(("cache", name),): stats["hits"] for name, stats in caches.items()}
+    misses = {(("cache", name),): stats["misses"] for name, stats in caches.items()}
+    cache_bytes = {
+        (("cache", name),): stats.get("bytes", stats.get("estimated_bytes", 0)) for name, stats in caches.items()
+    }
+    ready = {(("model", name),): int(status == "ready") for name, status in _model_status.items()}
+    return [
+        ("cache_hits_total", "counter", "Cache lookups that found an entry.", hits),
+        ("cache_misses_total", "counter", "Cache lookups that did not find an entry.", misses),
+        ("cache_bytes", "gauge", "Estimated size of each cache.", cache_bytes),
+        ("model_ready", "gauge", "1 when the model is loaded.", ready),
+    ]
 
-    return final_output_path
\ No newline at end of file
+register_collector(_collect_metrics)
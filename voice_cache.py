@@ -0,0 +1,88 @@
+# voice_cache.py
+import os
+import threading
+from collections import OrderedDict
+
+class VoiceCache:
+    """
+    Process-wide LRU cache of loaded Piper voices.
+
+    Entries are keyed by (voices_dir, voice_name, slot) and remember the mtime of the
+    .onnx file they were loaded from; a voice whose file changed on disk is reloaded.
+    `slot` lets parallel synthesis workers each keep their own copy of a voice.
+    The memory used by a voice is estimated from the size of its .onnx file, and the
+    least recently used voices are evicted once the total exceeds `max_bytes`.
+    """
+
+    def __init__(self, loader, max_bytes):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (mtime, size_bytes, voice)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, voice_name, voices_dir="voices", slot=0):
+        """Returns the loaded voice, loading it on a miss, or None if it is not installed."""
+        model_path = os.path.join(voices_dir, f"{voice_name}.onnx")
+        try:
+            mtime = os.path.getmtime(model_path)
+            size_bytes = os.path.getsize(model_path)
+        except OSError:
+            return None
+
+        key = (os.path.abspath(voices_dir), voice_name, slot)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Loading takes a while, so it happens outside the lock.
+        voice = self.loader(model_path)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (mtime, size_bytes, voice)
+            self._total_bytes += size_bytes
+            self._evict(keep=key)
+        return voice
+
+    def _evict(self, keep):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            _, size_bytes, _ = self._entries.pop(key)
+            self._total_bytes -= size_bytes
+            self.evictions += 1
+
+    def preload(self, voice_names, voices_dir="voices"):
+        """Loads the given voices into slot 0. Returns the names that were found."""
+        loaded = []
+        for voice_name in voice_names:
+            if self.get(voice_name, voices_dir) is not None:
+                loaded.append(voice_name)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loaded_voices": len(self._entries),
+                "estimated_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
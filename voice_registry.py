@@ -0,0 +1,136 @@
+# voice_registry.py
+import os
+import json
+import threading
+
+def parse_voice_name(voice_name):
+    """
+    Splits a Piper voice name such as "fr_FR-siwis-medium" into
+    (language, locale, speaker name, quality), e.g. ("fr", "fr_FR", "siwis", "medium").
+    """
+    locale, _, rest = voice_name.partition("-")
+    name, _, quality = rest.rpartition("-")
+    return locale.split("_")[0], locale, name or rest, quality if name else ""
+
+def index_voice_names(voice_names):
+    """Groups voice names by language: {"fr": ["fr_FR-gilles-low", ...]}, each list sorted."""
+    by_language = {}
+    for voice_name in voice_names:
+        by_language.setdefault(parse_voice_name(voice_name)[0], []).append(voice_name)
+    return {language: sorted(names) for language, names in by_language.items()}
+
+def _read_config(config_path, voice_name):
+    """Reads the fields of a voice's .onnx.json that the app uses."""
+    language, locale, name, quality = parse_voice_name(voice_name)
+    info = {
+        "name": voice_name,
+        "language": language,
+        "locale": locale,
+        "quality": quality,
+        "sample_rate": None,
+        "num_speakers": 1,
+        "speakers": [],
+    }
+    try:
+        with open(config_path, encoding="utf-8") as config_file:
+            config = json.load(config_file)
+    except (OSError, ValueError):
+        return info
+    audio = config.get("audio", {})
+    language_config = config.get("language", {})
+    info["language"] = language_config.get("family") or language
+    info["locale"] = language_config.get("code") or locale
+    info["quality"] = audio.get("quality") or quality
+    info["sample_rate"] = audio.get("sample_rate")
+    info["num_speakers"] = config.get("num_speakers", 1)
+    info["speakers"] = sorted(config.get("speaker_id_map", {}), key=config.get("speaker_id_map", {}).get)
+    return info
+
+class VoiceRegistry:
+    """
+    Index of the Piper voices installed in `voices_dir`.
+
+    The directory is only listed again when its mtime changes (a voice was added, removed or
+    renamed), so lookups cost one stat() call. Each voice's .onnx.json is read once and
+    re-read only if the file itself changed.
+    """
+
+    def __init__(self, voices_dir="voices"):
+        self.voices_dir = voices_dir
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._voices = {}       # name -> info dict
+        self._configs = {}      # name -> ((mtime_ns, size) of the .onnx.json, info)
+        self._by_language = {}
+        self.scans = 0
+
+    def _refresh(self):
+        try:
+            dir_mtime = os.stat(self.voices_dir).st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+        with self._lock:
+            if self.scans and dir_mtime == self._dir_mtime:
+                return
+            voices = {}
+            configs = {}
+            if dir_mtime is not None:
+                with os.scandir(self.voices_dir) as entries:
+                    names = {entry.name for entry in entries if entry.is_file()}
+                for filename in names:
+                    if not filename.endswith(".onnx"):
+                        continue
+                    voice_name = filename[:-len(".onnx")]
+                    config_path = os.path.join(self.voices_dir, f"{filename}.json")
+                    try:
+                        stat = os.stat(config_path)
+                        version = (stat.st_mtime_ns, stat.st_size)
+                    except FileNotFoundError:
+                        version = None
+                    cached = self._configs.get(voice_name)
+                    info = cached[1] if cached and cached[0] == version else _read_config(config_path, voice_name)
+                    configs[voice_name] = (version, info)
+                    voices[voice_name] = dict(info, has_config=version is not None)
+            self._voices = voices
+            self._configs = configs
+            by_language = {}
+            for voice_name, info in voices.items():
+                by_language.setdefault(info["language"], []).append(voice_name)
+            self._by_language = {language: sorted(names) for language, names in by_language.items()}
+            self._dir_mtime = dir_mtime
+            self.scans += 1
+
+    def get(self, voice_name):
+        """Returns the info dict of an installed voice, or None."""
+        self._refresh()
+        info = self._voices.get(voice_name)
+        return dict(info) if info else None
+
+    def is_installed(self, voice_name):
+        """True if both the .onnx model and its .onnx.json config are present."""
+        info = self.get(voice_name)
+        return bool(info and info["has_config"])
+
+    def voices(self, language=None, quality=None):
+        """Installed voice names, optionally filtered by language code and quality, sorted."""
+        self._refresh()
+        names = self._by_language.get(language, []) if language else sorted(self._voices)
+        if quality:
+            names = [name for name in names if self._voices[name]["quality"] == quality]
+        return list(names)
+
+    def by_language(self):
+        """Installed voice names grouped by language: {"fr": ["fr_FR-siwis-medium", ...]}."""
+        self._refresh()
+        return {language: list(names) for language, names in self._by_language.items()}
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def get_registry(voices_dir="voices"):
+    """Returns the shared registry of `voices_dir`."""
+    key = os.path.abspath(voices_dir)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = VoiceRegistry(voices_dir)
+        return _registries[key]